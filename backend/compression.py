@@ -0,0 +1,94 @@
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON responses are compressed in one piece once the whole body is known. Streamed responses
+# (exports, import results, task downloads), PDFs and anything already encoded pass through.
+
+COMPRESSIBLE_TYPES = ("application/json",)
+
+def accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def is_compressible(self, headers: MutableHeaders) -> bool:
+        return headers.get("content-type", "").split(";")[0].strip() in COMPRESSIBLE_TYPES
+
+    def should_compress(self, headers: MutableHeaders, message: dict) -> bool:
+        return (
+            self.is_compressible(headers)
+            and "content-encoding" not in headers
+            and not message.get("more_body", False)
+            and len(message.get("body", b"")) >= self.minimum_size
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            # Holds back the start message until the first body chunk shows whether to compress
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            passthrough = True
+            headers = MutableHeaders(raw=start["headers"])
+            # Vary goes on every compressible response, compressed or not, so a shared cache
+            # never serves an identity body to a gzip client or the reverse
+            if self.is_compressible(headers):
+                headers.add_vary_header("Accept-Encoding")
+            if encoding is not None and self.should_compress(headers, message):
+                body = self.compress(encoding, message.get("body", b""))
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
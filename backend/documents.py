@@ -0,0 +1,102 @@
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+import io
+
+# Renderers run in worker processes (see pdf_pool in main.py), so they take plain dicts
+# and return bytes, and this module must not import anything that touches the database.
+
+# Bump when a layout changes so cached documents rendered by the old code are not served
+RENDER_VERSION = 1
+
+# The exact inputs each renderer reads; main.py hashes these to key the document cache
+JOB_CARD_FIELDS = [
+    "id", "customer_name", "phone", "car_model", "vehicle_number",
+    "work_description", "estimated_amount", "advance_paid", "status"
+]
+INVOICE_JOB_FIELDS = [
+    "customer_name", "phone", "car_model", "vehicle_number", "work_description", "estimated_amount"
+]
+INVOICE_WORKSHOP_FIELDS = ["name", "address", "gst_number", "currency"]
+
+def render_job_card(job: dict, currency_symbol: str) -> bytes:
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    pdf.setFont("Helvetica-Bold", 20)
+    pdf.drawString(1*inch, height - 1*inch, "JOB CARD")
+
+    pdf.setFont("Helvetica", 12)
+    y = height - 1.5*inch
+    pdf.drawString(1*inch, y, f"Job ID: {job['id'][:8]}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Customer: {job['customer_name']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Phone: {job['phone']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Vehicle: {job['car_model']} - {job['vehicle_number']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Work: {job['work_description']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Estimated Amount: {currency_symbol} {job['estimated_amount']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Advance Paid: {currency_symbol} {job['advance_paid']}")
+    y -= 0.3*inch
+    pdf.drawString(1*inch, y, f"Status: {job['status']}")
+
+    pdf.save()
+    return buffer.getvalue()
+
+def render_invoice(job: dict, workshop: dict, total_paid: float) -> bytes:
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    pdf.setFont("Helvetica-Bold", 24)
+    pdf.drawString(1*inch, height - 1*inch, "INVOICE")
+
+    pdf.setFont("Helvetica", 10)
+    y = height - 1.3*inch
+    pdf.drawString(1*inch, y, workshop["name"])
+    y -= 0.2*inch
+    if workshop.get("address"):
+        pdf.drawString(1*inch, y, workshop["address"])
+        y -= 0.2*inch
+    if workshop.get("gst_number"):
+        pdf.drawString(1*inch, y, f"GST: {workshop['gst_number']}")
+        y -= 0.2*inch
+
+    y -= 0.3*inch
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(1*inch, y, "Bill To:")
+    y -= 0.2*inch
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(1*inch, y, job["customer_name"])
+    y -= 0.2*inch
+    pdf.drawString(1*inch, y, job["phone"])
+
+    y -= 0.5*inch
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(1*inch, y, "Service Details")
+    y -= 0.3*inch
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(1*inch, y, f"Vehicle: {job['car_model']} - {job['vehicle_number']}")
+    y -= 0.2*inch
+    pdf.drawString(1*inch, y, f"Work: {job['work_description']}")
+
+    y -= 0.5*inch
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(1*inch, y, "Amount Details")
+    y -= 0.3*inch
+    pdf.setFont("Helvetica", 10)
+    inv_currency = workshop.get('currency', 'INR')
+    pdf.drawString(1*inch, y, f"Total Amount: {inv_currency} {job['estimated_amount']}")
+    y -= 0.2*inch
+    pdf.drawString(1*inch, y, f"Paid: {inv_currency} {total_paid}")
+    y -= 0.2*inch
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(1*inch, y, f"Balance: {inv_currency} {job['estimated_amount'] - total_paid}")
+
+    pdf.save()
+    return buffer.getvalue()
@@ -1,23 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header, Query, Request
+from fastapi.responses import StreamingResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
+import re
+import time
+import asyncio
+from collections import OrderedDict, deque
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
 import io
+import csv
+import codecs
+import json
+import tempfile
+import hashlib
+import zipfile
+import base64
 import xlsxwriter
 from bson import ObjectId
+from pymongo import ReturnDocument, IndexModel, ASCENDING, DESCENDING, UpdateOne, DeleteOne
+from pymongo.errors import PyMongoError, BulkWriteError
+
+from workers import WorkerPool, WORKER_POOLS
+from compression import CompressionMiddleware
+from documents import (
+    render_job_card, render_invoice, RENDER_VERSION,
+    JOB_CARD_FIELDS, INVOICE_JOB_FIELDS, INVOICE_WORKSHOP_FIELDS
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,12 +45,74 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+# Multi-document transactions need a replica set (Atlas always is); set false for a standalone dev server
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'true').lower() == 'true'
 
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '4'))
+
+# PDF rendering
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '2'))
+PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', '30'))
+DOCUMENT_CACHE_DIR = Path(os.environ.get('DOCUMENT_CACHE_DIR', Path(tempfile.gettempdir()) / 'revops_documents'))
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get('DOCUMENT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+BULK_RENDER_CONCURRENCY = int(os.environ.get('BULK_RENDER_CONCURRENCY', str(PDF_WORKERS * 2)))
+
+# Principal cache (per process; entries are also invalidated on manager/workshop changes)
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', '30'))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000'))
+
+# Response compression and conditional GETs
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+ETAG_WINDOW = float(os.environ.get('ETAG_WINDOW', '30'))
+
+# Pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+BULK_CONFIRM_MAX = 1000
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Phones are keyed on their last digits so a leading country code or trunk 0 doesn't split a customer
+PHONE_KEY_DIGITS = int(os.environ.get('PHONE_KEY_DIGITS', '10'))
+JOB_HISTORY_LIMIT = 20  # updates and payments embedded in GET /jobs/{id}
+# List sort keys; each has a (workshop_id, field, id) index so every sort pages by keyset
+JOB_SORT_FIELDS = ("created_at", "due_at", "estimated_amount")
+PAYMENT_SORT_FIELDS = ("payment_date", "amount")
+
+# Export
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Bulk import
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '100000'))
+IMPORT_MAX_ERRORS = 1000
+
+# Analytics
+DASHBOARD_DAYS = 30
+DASHBOARD_SOURCES = ("rollup", "aggregate", "python")
+DASHBOARD_SOURCE = os.environ.get('DASHBOARD_SOURCE', 'rollup')
+
+# Audit log (job_updates write-behind buffer)
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '1'))
+AUDIT_MAX_PENDING = 100000
+
+# Background tasks
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', '2'))
+TASK_WORKSHOP_CONCURRENCY = int(os.environ.get('TASK_WORKSHOP_CONCURRENCY', '1'))
+TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', '2'))
+TASK_HEARTBEAT_INTERVAL = 10
+TASK_STALE_AFTER = 60
+TASK_MAX_ATTEMPTS = 3
+TASK_RESULT_TTL_HOURS = float(os.environ.get('TASK_RESULT_TTL_HOURS', '24'))
+
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
@@ -89,6 +170,11 @@ class JobCreate(BaseModel):
     worker_assigned: Optional[str] = None
     internal_notes: Optional[str] = None
 
+class JobImport(JobCreate):
+    status: str = JobStatus.PENDING
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
 class JobUpdate(BaseModel):
     customer_name: Optional[str] = None
     phone: Optional[str] = None
@@ -115,21 +201,121 @@ class SettlementCreate(BaseModel):
     job_ids: List[str]
     notes: Optional[str] = None
 
+class PaymentBulkConfirm(BaseModel):
+    ids: Optional[List[str]] = None
+    job_id: Optional[str] = None
+    manager_id: Optional[str] = None
+    paid_before: Optional[str] = None
+
+class SettlementBulkConfirm(BaseModel):
+    ids: Optional[List[str]] = None
+    manager_id: Optional[str] = None
+    submitted_before: Optional[str] = None
+
+class TaskStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class TaskCreate(BaseModel):
+    kind: str
+    format: str = "xlsx"
+    status: Optional[str] = None
+    manager_id: Optional[str] = None
+    created_from: Optional[str] = None
+    created_to: Optional[str] = None
+
+# ============ WORKER POOLS ============
+
+bcrypt_pool = WorkerPool(
+    "bcrypt",
+    ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt"),
+    BCRYPT_WORKERS
+)
+
+# ReportLab is pure Python and holds the GIL, so PDFs render in separate processes.
+# spawn (not fork) keeps the Motor client and its threads out of the children.
+pdf_pool = WorkerPool(
+    "pdf",
+    ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")),
+    PDF_WORKERS
+)
+
+async def render_pdf(fn, *args) -> bytes:
+    try:
+        return await pdf_pool.run(fn, *args, timeout=PDF_RENDER_TIMEOUT)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Document rendering timed out")
+
 # ============ AUTH UTILITIES ============
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost factor
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# ============ PRINCIPAL RESOLUTION ============
+
+class TTLCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
+
+async def resolve_workshop_id(user: dict) -> Optional[str]:
+    if user["role"] == UserRole.MANAGER:
+        manager = await db.managers.find_one({"user_id": user["id"], "is_active": True}, {"_id": 0, "workshop_id": 1})
+        return manager["workshop_id"] if manager else None
+    workshop = await db.workshops.find_one({"owner_id": user["id"]}, {"_id": 0, "id": 1})
+    return workshop["id"] if workshop else None
+
+def require_workshop(current_user: dict) -> str:
+    if not current_user.get("workshop_id"):
+        if current_user["role"] == UserRole.MANAGER:
+            raise HTTPException(status_code=404, detail="Manager record not found")
+        raise HTTPException(status_code=404, detail="Workshop not found")
+    return current_user["workshop_id"]
+
 async def get_current_user(authorization: Optional[str] = Header(None)):
+    # Returns the user (without password_hash) plus its resolved workshop_id. FastAPI already
+    # shares the result within a request; the TTL cache shares it across requests.
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
@@ -140,15 +326,1040 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            principal = {**user, "workshop_id": await resolve_workshop_id(user)}
+            principal_cache.set(user_id, principal)
+        return dict(principal)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# ============ DOCUMENT CACHE ============
+
+class DocumentCache:
+    # Size-bounded LRU of rendered PDFs on local disk, keyed by a hash of the render inputs.
+    # Files persist across restarts; each process keeps its own recency index.
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.directory.glob("*.pdf"), key=lambda p: p.stat().st_mtime):
+            self.entries[path.stem] = path.stat().st_size
+            self.total_bytes += path.stat().st_size
+        self.evict()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            content = await asyncio.to_thread(self.path(key).read_bytes)
+        except FileNotFoundError:
+            self.discard(key)
+            self.misses += 1
+            return None
+        if key not in self.entries:
+            self.entries[key] = len(content)
+            self.total_bytes += len(content)
+        self.entries.move_to_end(key)
+        os.utime(self.path(key))
+        self.hits += 1
+        return content
+
+    async def put(self, key: str, content: bytes):
+        tmp = self.directory / f"{key}.{uuid.uuid4().hex}.tmp"
+        await asyncio.to_thread(tmp.write_bytes, content)
+        os.replace(tmp, self.path(key))
+        self.discard(key)
+        self.entries[key] = len(content)
+        self.total_bytes += len(content)
+        self.evict()
+
+    def discard(self, key: str):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.path(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+document_cache = DocumentCache(DOCUMENT_CACHE_DIR, DOCUMENT_CACHE_MAX_BYTES)
+
+def document_key(kind: str, inputs: dict) -> str:
+    raw = json.dumps({"kind": kind, "version": RENDER_VERSION, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def get_or_render_pdf(key: str, renderer, args: tuple) -> bytes:
+    content = await document_cache.get(key)
+    if content is None:
+        content = await render_pdf(renderer, *args)
+        await document_cache.put(key, content)
+    return content
+
+async def cached_pdf_response(kind: str, inputs: dict, renderer, args: tuple, filename: str, if_none_match: Optional[str]):
+    key = document_key(kind, inputs)
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename={filename}"
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    content = await get_or_render_pdf(key, renderer, args)
+    return Response(content, media_type="application/pdf", headers=headers)
+
+def invoice_inputs(job: dict, workshop: dict, total_paid: float):
+    invoice_job = {field: job.get(field) for field in INVOICE_JOB_FIELDS}
+    invoice_workshop = {field: workshop.get(field) for field in INVOICE_WORKSHOP_FIELDS}
+    if not invoice_workshop["currency"]:
+        invoice_workshop["currency"] = 'INR'
+    inputs = {"job": invoice_job, "workshop": invoice_workshop, "total_paid": total_paid}
+    return inputs, (invoice_job, invoice_workshop, total_paid)
+
+class ZipStreamBuffer(io.RawIOBase):
+    # Write-only sink for zipfile; drained after every entry so only one PDF is held at a time
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def render_invoice_entry(job: dict, workshop: dict, total_paid: float):
+    # Any failure is reported in the ZIP's errors.txt rather than aborting the whole archive
+    try:
+        inputs, args = invoice_inputs(job, workshop, total_paid)
+        content = await get_or_render_pdf(document_key("invoice", inputs), render_invoice, args)
+    except HTTPException as e:
+        return job["id"], None, e.detail
+    except Exception as e:
+        logger.warning(f"Invoice render failed for job {job['id']}: {e!r}")
+        return job["id"], None, f"Render failed: {type(e).__name__}: {e}"
+    return job["id"], content, None
+
+async def stream_invoice_zip(jobs, workshop: dict, concurrency: int = BULK_RENDER_CONCURRENCY):
+    buffer = ZipStreamBuffer()
+    archive = zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+    pending = set()
+    errors = []
+
+    def add_finished(done):
+        for task in done:
+            job_id, content, error = task.result()
+            if error:
+                errors.append(f"{job_id}: {error}")
+            else:
+                archive.writestr(f"invoice_{job_id}.pdf", content)
+
+    try:
+        async for job in jobs:
+            pending.add(asyncio.ensure_future(render_invoice_entry(job, workshop, job["total_paid"])))
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                add_finished(done)
+                yield buffer.drain()
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            add_finished(done)
+            yield buffer.drain()
+
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+        archive.close()
+        yield buffer.drain()
+    finally:
+        for task in pending:
+            task.cancel()
+
+# ============ CONDITIONAL REQUESTS ============
+
+class ChangeCounter:
+    # Per-process version of each workshop's data, bumped by every route that writes it once the
+    # write has succeeded. List and dashboard ETags hash the version with the caller and query string,
+    # so a poll whose If-None-Match still matches is answered 304 before any database query.
+    # Other workers' writes are not seen here, so tags also roll over every ETAG_WINDOW seconds;
+    # that bounds how long a 304 can hide another process's write (or the clock, e.g. overdue jobs).
+    def __init__(self, window: float):
+        self.window = window
+        self.epoch = uuid.uuid4().hex
+        self.versions = {}
+        self.not_modified = 0
+        self.full = 0
+
+    def bump(self, workshop_id: Optional[str]):
+        if workshop_id:
+            self.versions[workshop_id] = self.versions.get(workshop_id, 0) + 1
+
+    def etag(self, workshop_id: Optional[str], *parts) -> str:
+        version = self.versions.get(workshop_id, 0)
+        raw = json.dumps([self.epoch, int(time.time() // self.window), workshop_id, version, *parts])
+        digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+        return f'"{digest}"'
+
+    def stats(self) -> dict:
+        return {
+            "workshops": len(self.versions),
+            "window_seconds": self.window,
+            "not_modified": self.not_modified,
+            "full": self.full
+        }
+
+change_counter = ChangeCounter(ETAG_WINDOW)
+
+def conditional_get(request: Request, response: Response, current_user: dict) -> Optional[Response]:
+    # Returns the 304 to send, or None after putting the ETag on the route's response
+    etag = change_counter.etag(
+        current_user["workshop_id"], current_user["id"], request.url.path,
+        sorted(request.query_params.multi_items())
+    )
+    headers = {"ETag": f"W/{etag}", "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        change_counter.not_modified += 1
+        # A 304 has no content type for the compression middleware to key on, so it repeats
+        # the Vary the full JSON response would have carried
+        return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+    change_counter.full += 1
+    response.headers.update(headers)
+    return None
+
+# ============ INDEXES ============
+
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "workshops": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("owner_id", ASCENDING)]),
+    ],
+    "invite_codes": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("code", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING)]),
+    ],
+    "managers": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING), ("is_active", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("manager_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("worker_assigned", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("completed_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("due_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("status", ASCENDING), ("due_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("estimated_amount", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("manager_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("search_plate", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("search_phone", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("search_name", ASCENDING)]),
+    ],
+    "vehicles": [
+        IndexModel([("workshop_id", ASCENDING), ("plate", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING), ("last_visit", DESCENDING)]),
+    ],
+    "customers": [
+        IndexModel([("workshop_id", ASCENDING), ("phone", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING), ("last_visit", DESCENDING)]),
+    ],
+    "job_updates": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("job_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("job_id", ASCENDING), ("payment_date", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("confirmed_by_owner", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("payment_type", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("amount", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("collected_by_manager_id", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "settlements": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("workshop_id", ASCENDING), ("submitted_date", DESCENDING)]),
+        IndexModel([("manager_id", ASCENDING), ("submitted_date", DESCENDING)]),
+    ],
+    "analytics_rollups": [
+        IndexModel([("workshop_id", ASCENDING)], unique=True),
+    ],
+    "tasks": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)]),
+        IndexModel([("workshop_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+
+async def ensure_indexes():
+    # create_indexes is a no-op for indexes that already exist with the same spec
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except PyMongoError as e:
+            logger.warning(f"Could not ensure indexes on {collection}: {e}")
+
+# ============ TRANSACTIONS ============
+
+async def run_in_transaction(callback):
+    # The driver retries callback(session) on transient errors, so it must only do database writes
+    if not MONGO_TRANSACTIONS:
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+# ============ PAGINATION UTILITIES ============
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    raw = json.dumps([doc.get(sort_field), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode('utf-8')))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, doc_id
+
+def keyset_query(query: dict, sort_field: str, cursor: Optional[str], direction: int = -1) -> dict:
+    # Keyset on (sort_field, id): resume strictly after the last document of the previous page
+    if not cursor:
+        return query
+    value, doc_id = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    return {"$and": [query, {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "id": {op: doc_id}}
+    ]}]}
+
+def parse_sort(sort: str, allowed: tuple):
+    # "field" sorts ascending, "-field" descending
+    field = sort.lstrip("-")
+    if field not in allowed:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(allowed)}, optionally prefixed with -")
+    return field, -1 if sort.startswith("-") else 1
+
+async def fetch_page(collection, query: dict, projection: dict, sort_field: str, direction: int,
+                     limit: int, cursor: Optional[str]):
+    query = keyset_query(query, sort_field, cursor, direction)
+    docs = await collection.find(query, projection).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+# ============ LIST FILTERS ============
+
+OPEN_JOB_STATUSES = [JobStatus.PENDING, JobStatus.IN_PROGRESS, JobStatus.WAITING_PARTS]
+
+def parse_date_bound(value: str, end: bool = False) -> str:
+    # Accepts a date (YYYY-MM-DD) or ISO datetime; a bare end date includes that whole day
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+def date_range_query(start: Optional[str], end: Optional[str]) -> dict:
+    condition = {}
+    if start:
+        condition["$gte"] = parse_date_bound(start)
+    if end:
+        condition["$lt" if len(end) == 10 else "$lte"] = parse_date_bound(end, end=True)
+    return condition
+
+def amount_range_query(minimum: Optional[float], maximum: Optional[float]) -> dict:
+    condition = {}
+    if minimum is not None:
+        condition["$gte"] = minimum
+    if maximum is not None:
+        condition["$lte"] = maximum
+    return condition
+
+def add_range_filters(query: dict, ranges: dict) -> dict:
+    for field, condition in ranges.items():
+        if condition:
+            query[field] = condition
+    return query
+
+def overdue_query(overdue: bool) -> dict:
+    # due_at is created_at + planned_completion_days, kept on the job by build_job and update_job
+    now = datetime.now(timezone.utc).isoformat()
+    if overdue:
+        return {"status": {"$in": OPEN_JOB_STATUSES}, "due_at": {"$lt": now}}
+    return {"$or": [{"status": {"$nin": OPEN_JOB_STATUSES}}, {"due_at": {"$gte": now}}]}
+
+# ============ LIST PROJECTIONS ============
+# List endpoints return a summary of each document by default; `fields=` names the columns
+# wanted (stored or computed) or `full` for whole documents. Computed fields fetch the stored
+# fields they are derived from, and id plus the sort key are always fetched for cursors.
+
+JOB_FIELDS = {
+    "id", "workshop_id", "manager_id", *JobCreate.model_fields, "status", "created_at", "updated_at",
+    "due_at", "completed_at", "total_paid", "confirmed_paid", "payment_count"
+}
+JOB_COMPUTED_FIELDS = {
+    "manager_name": ("manager_id",),
+    "remaining_amount": ("estimated_amount", "total_paid"),
+}
+JOB_SUMMARY_FIELDS = (
+    "customer_name", "status", "vehicle_number", "car_model", "work_description",
+    "manager_name", "estimated_amount", "total_paid", "remaining_amount"
+)
+
+PAYMENT_FIELDS = {
+    "id", "job_id", "workshop_id", "amount", "payment_type", "notes", "collected_by_manager_id",
+    "confirmed_by_owner", "payment_date", "confirmation_date"
+}
+PAYMENT_COMPUTED_FIELDS = {
+    "job": ("job_id",),
+    "manager_name": ("collected_by_manager_id",),
+}
+PAYMENT_SUMMARY_FIELDS = ("amount", "payment_type", "payment_date", "confirmed_by_owner", "job", "manager_name")
+
+def list_projection(fields: Optional[str], summary: tuple, stored: set, computed: dict,
+                    full: dict, sort_field: str) -> dict:
+    if fields == "full":
+        return full
+    if fields is None or fields == "summary":
+        names = summary
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in stored and name not in computed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    for name in names:
+        for field in computed.get(name, (name,)):
+            projection[field] = 1
+    return projection
+
+# ============ ENRICHMENT UTILITIES ============
+
+async def get_user_names(user_ids) -> Dict[str, str]:
+    ids = list({uid for uid in user_ids if uid})
+    if not ids:
+        return {}
+    users = await db.users.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(len(ids))
+    return {u["id"]: u["name"] for u in users}
+
+def add_remaining_amount(job: dict) -> dict:
+    # total_paid is maintained on the job by create_payment and filled in for older jobs on startup
+    # (backfill_job_totals); see `manage.py reconcile-job-totals` for drift
+    job.setdefault("total_paid", 0)
+    job["remaining_amount"] = job["estimated_amount"] - job["total_paid"]
+    return job
+
+def check_job_access(job: dict, current_user: dict):
+    if current_user["role"] == UserRole.MANAGER:
+        if job["manager_id"] != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Access denied")
+    elif job["workshop_id"] != current_user["workshop_id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+async def enrich_jobs(jobs: List[dict]) -> List[dict]:
+    # One users query per page, regardless of page size. Jobs may be projected (see list_projection),
+    # so each computed field is only added when the fields it derives from were fetched.
+    manager_names = await get_user_names(j.get("manager_id") for j in jobs)
+    for job in jobs:
+        if job.get("manager_id") in manager_names:
+            job["manager_name"] = manager_names[job["manager_id"]]
+        if "estimated_amount" in job and "total_paid" in job:
+            add_remaining_amount(job)
+    return jobs
+
+async def enrich_payments(payments: List[dict]) -> List[dict]:
+    job_ids = list({p["job_id"] for p in payments if "job_id" in p})
+    jobs, manager_names = await asyncio.gather(
+        db.jobs.find(
+            {"id": {"$in": job_ids}},
+            {"_id": 0, "id": 1, "customer_name": 1, "vehicle_number": 1}
+        ).to_list(len(job_ids)),
+        get_user_names(p.get("collected_by_manager_id") for p in payments)
+    )
+    jobs_by_id = {j["id"]: j for j in jobs}
+    for payment in payments:
+        job = jobs_by_id.get(payment.get("job_id"))
+        if job:
+            payment["job"] = {
+                "customer_name": job["customer_name"],
+                "vehicle_number": job["vehicle_number"]
+            }
+        if payment.get("collected_by_manager_id") in manager_names:
+            payment["manager_name"] = manager_names[payment["collected_by_manager_id"]]
+    return payments
+
+# ============ BULK CONFIRMATION ============
+
+async def confirm_many(collection: str, ids: Optional[List[str]], query: dict, workshop_id: str, fields: dict, session=None):
+    # Resolves explicit ids (checking workshop ownership in the same query) or a filter over the
+    # workshop's unconfirmed documents, then confirms them with one update_many.
+    # Returns (results, confirmed_docs, has_more): results holds an outcome per id, and has_more
+    # is set when a filter matched more than BULK_CONFIRM_MAX documents.
+    projection = {"_id": 0, "id": 1, "workshop_id": 1, "confirmed_by_owner": 1, **fields}
+    if ids is not None:
+        docs = await db[collection].find({"id": {"$in": ids}}, projection, session=session).to_list(len(ids))
+        by_id = {doc["id"]: doc for doc in docs}
+        results = []
+        eligible = []
+        for doc_id in dict.fromkeys(ids):
+            doc = by_id.get(doc_id)
+            if not doc:
+                outcome = "not_found"
+            elif doc.get("workshop_id") != workshop_id:
+                outcome = "forbidden"
+            elif doc["confirmed_by_owner"]:
+                outcome = "already_confirmed"
+            else:
+                outcome = "confirmed"
+                eligible.append(doc)
+            results.append({"id": doc_id, "status": outcome})
+        has_more = False
+    else:
+        eligible = await db[collection].find(
+            {**query, "workshop_id": workshop_id, "confirmed_by_owner": False},
+            projection,
+            session=session
+        ).limit(BULK_CONFIRM_MAX + 1).to_list(BULK_CONFIRM_MAX + 1)
+        has_more = len(eligible) > BULK_CONFIRM_MAX
+        eligible = eligible[:BULK_CONFIRM_MAX]
+        results = [{"id": doc["id"], "status": "confirmed"} for doc in eligible]
+
+    if eligible:
+        await db[collection].update_many(
+            {"id": {"$in": [doc["id"] for doc in eligible]}, "confirmed_by_owner": False},
+            {"$set": {
+                "confirmed_by_owner": True,
+                "confirmation_date": datetime.now(timezone.utc).isoformat()
+            }},
+            session=session
+        )
+    return results, eligible, has_more
+
+def bulk_confirm_ids(ids: Optional[List[str]], query: dict) -> Optional[List[str]]:
+    if ids is None and not query:
+        raise HTTPException(status_code=400, detail="Provide ids or at least one filter")
+    if ids is not None and len(ids) > BULK_CONFIRM_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_CONFIRM_MAX} ids per request")
+    return ids
+
+# ============ ANALYTICS ROLLUPS ============
+
+def rollup_day(created_at: str) -> str:
+    return datetime.fromisoformat(created_at).strftime("%Y-%m-%d")
+
+def empty_rollup(workshop_id: str) -> dict:
+    return {
+        "workshop_id": workshop_id,
+        "total_jobs": 0,
+        "total_revenue": 0,
+        "total_collected": 0,
+        "confirmed_collected": 0,
+        "status_counts": {},
+        "manager_revenue": {},
+        "daily_revenue": {}
+    }
+
+def job_rollup_inc(job: dict) -> dict:
+    amount = job["estimated_amount"]
+    return {
+        "total_jobs": 1,
+        "total_revenue": amount,
+        f"status_counts.{job['status']}": 1,
+        f"manager_revenue.{job['manager_id']}.total": amount,
+        f"manager_revenue.{job['manager_id']}.jobs": 1,
+        f"daily_revenue.{rollup_day(job['created_at'])}": amount
+    }
+
+def job_update_rollup_inc(before: dict, update_data: dict) -> dict:
+    inc = {}
+    new_status = update_data.get("status")
+    if new_status and new_status != before["status"]:
+        inc[f"status_counts.{before['status']}"] = -1
+        inc[f"status_counts.{new_status}"] = 1
+
+    if "estimated_amount" in update_data:
+        delta = update_data["estimated_amount"] - before["estimated_amount"]
+        if delta:
+            inc["total_revenue"] = delta
+            inc[f"manager_revenue.{before['manager_id']}.total"] = delta
+            inc[f"daily_revenue.{rollup_day(before['created_at'])}"] = delta
+    return inc
+
+def merge_rollup_incs(incs) -> dict:
+    merged = {}
+    for inc in incs:
+        for key, value in inc.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+async def apply_rollup(workshop_id: str, inc: dict, session=None):
+    if inc:
+        await db.analytics_rollups.update_one({"workshop_id": workshop_id}, {"$inc": inc}, upsert=True, session=session)
+
+async def compute_rollup(workshop_id: str) -> dict:
+    # Recompute from raw data; used by `manage.py rebuild-rollups` to seed and verify the counters
+    rollup = empty_rollup(workshop_id)
+    job_fields = {"_id": 0, "estimated_amount": 1, "status": 1, "manager_id": 1, "created_at": 1}
+    async for job in db.jobs.find({"workshop_id": workshop_id}, job_fields):
+        amount = job["estimated_amount"]
+        day = rollup_day(job["created_at"])
+        rollup["total_jobs"] += 1
+        rollup["total_revenue"] += amount
+        rollup["status_counts"][job["status"]] = rollup["status_counts"].get(job["status"], 0) + 1
+        manager = rollup["manager_revenue"].setdefault(job["manager_id"], {"total": 0, "jobs": 0})
+        manager["total"] += amount
+        manager["jobs"] += 1
+        rollup["daily_revenue"][day] = rollup["daily_revenue"].get(day, 0) + amount
+
+    async for payment in db.payments.find({"workshop_id": workshop_id}, {"_id": 0, "amount": 1, "confirmed_by_owner": 1}):
+        rollup["total_collected"] += payment["amount"]
+        if payment.get("confirmed_by_owner"):
+            rollup["confirmed_collected"] += payment["amount"]
+
+    return rollup
+
+async def aggregate_rollup(workshop_id: str) -> dict:
+    # Same shape as compute_rollup, but grouped server-side so only the buckets leave MongoDB
+    since = (datetime.now(timezone.utc) - timedelta(days=DASHBOARD_DAYS - 1)).strftime("%Y-%m-%d")
+    jobs_pipeline = [
+        {"$match": {"workshop_id": workshop_id}},
+        {"$facet": {
+            "totals": [{"$group": {"_id": None, "jobs": {"$sum": 1}, "revenue": {"$sum": "$estimated_amount"}}}],
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "by_manager": [{"$group": {"_id": "$manager_id", "total": {"$sum": "$estimated_amount"}, "jobs": {"$sum": 1}}}],
+            "daily": [
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {"_id": {"$substrBytes": ["$created_at", 0, 10]}, "total": {"$sum": "$estimated_amount"}}}
+            ]
+        }}
+    ]
+    payments_pipeline = [
+        {"$match": {"workshop_id": workshop_id}},
+        {"$group": {
+            "_id": None,
+            "collected": {"$sum": "$amount"},
+            "confirmed": {"$sum": {"$cond": ["$confirmed_by_owner", "$amount", 0]}}
+        }}
+    ]
+    job_facets, payment_totals = await asyncio.gather(
+        db.jobs.aggregate(jobs_pipeline).to_list(1),
+        db.payments.aggregate(payments_pipeline).to_list(1)
+    )
+    facets = job_facets[0] if job_facets else {}
+    totals = facets.get("totals") or [{}]
+    payments = payment_totals[0] if payment_totals else {}
+
+    rollup = empty_rollup(workshop_id)
+    rollup["total_jobs"] = totals[0].get("jobs", 0)
+    rollup["total_revenue"] = totals[0].get("revenue", 0)
+    rollup["total_collected"] = payments.get("collected", 0)
+    rollup["confirmed_collected"] = payments.get("confirmed", 0)
+    rollup["status_counts"] = {row["_id"]: row["count"] for row in facets.get("by_status", [])}
+    rollup["manager_revenue"] = {
+        row["_id"]: {"total": row["total"], "jobs": row["jobs"]} for row in facets.get("by_manager", [])
+    }
+    rollup["daily_revenue"] = {row["_id"]: row["total"] for row in facets.get("daily", [])}
+    return rollup
+
+def dashboard_from_rollup(rollup: dict) -> dict:
+    total_jobs = rollup.get("total_jobs", 0)
+    total_revenue = rollup.get("total_revenue", 0)
+    total_collected = rollup.get("total_collected", 0)
+
+    now = datetime.now(timezone.utc)
+    days = rollup.get("daily_revenue", {})
+    daily_revenue = {}
+    for i in range(DASHBOARD_DAYS):
+        date = (now - timedelta(days=i)).strftime("%Y-%m-%d")
+        daily_revenue[date] = days.get(date, 0)
+
+    return {
+        "total_jobs": total_jobs,
+        "total_revenue": total_revenue,
+        "total_collected": total_collected,
+        "total_confirmed": rollup.get("confirmed_collected", 0),
+        "total_credits": total_revenue - total_collected,
+        "avg_job_value": total_revenue / total_jobs if total_jobs > 0 else 0,
+        "status_counts": {k: v for k, v in rollup.get("status_counts", {}).items() if v},
+        "manager_revenue": {k: v for k, v in rollup.get("manager_revenue", {}).items() if v.get("jobs")},
+        "daily_revenue": daily_revenue
+    }
+
+# ============ AUDIT LOG ============
+
+class AuditBuffer:
+    # Write-behind buffer for job_updates: routes add entries after their writes commit and
+    # a background loop flushes them with insert_many every AUDIT_FLUSH_INTERVAL seconds or
+    # AUDIT_BATCH_SIZE entries. Failed flushes keep the batch and retry on the next tick;
+    # only a hard crash loses entries (at most one interval's worth).
+    def __init__(self, collection: str, batch_size: int, interval: float, max_pending: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.flush_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.loop = None
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped
+        }
+
+    def add(self, entry: dict):
+        self.pending.append(entry)
+        if len(self.pending) > self.max_pending:
+            # Mongo has been unreachable for a long time; shed the oldest rather than grow unbounded
+            overflow = len(self.pending) - self.max_pending
+            del self.pending[:overflow]
+            self.dropped += overflow
+            logger.warning(f"Audit buffer full, dropped {overflow} {self.collection} entries")
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.create_task(self.run())
+
+    async def stop(self, attempts: int = 3):
+        if self.loop is not None:
+            self.loop.cancel()
+            await asyncio.gather(self.loop, return_exceptions=True)
+            self.loop = None
+        for _ in range(attempts):
+            if await self.flush():
+                break
+            await asyncio.sleep(self.interval)
+        if self.pending:
+            logger.error(f"Shutting down with {len(self.pending)} unflushed {self.collection} entries")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        async with self.flush_lock:
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                try:
+                    await db[self.collection].insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Per-document errors will not succeed on retry; duplicates are entries a
+                    # previous attempt already wrote before its connection failed
+                    errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                    if errors:
+                        logger.warning(f"Dropped {len(errors)} {self.collection} entries: {errors[0].get('errmsg')}")
+                        self.dropped += len(errors)
+                except PyMongoError as e:
+                    self.failed_flushes += 1
+                    logger.warning(f"Audit flush of {len(batch)} {self.collection} entries failed, will retry: {e}")
+                    return False
+                del self.pending[:len(batch)]
+                self.flushed += len(batch)
+        return True
+
+audit_log = AuditBuffer("job_updates", AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_MAX_PENDING)
+
+# ============ SEARCH KEYS ============
+# Jobs carry normalized copies of the fields the front desk searches by, so lookups are
+# index range/key scans within the workshop instead of case- and format-sensitive text matches.
+
+SEARCH_SOURCE_FIELDS = {"vehicle_number": "search_plate", "phone": "search_phone", "customer_name": "search_name"}
+JOB_PROJECTION = {"_id": 0, **{field: 0 for field in SEARCH_SOURCE_FIELDS.values()}}
+
+def normalize_plate(value: str) -> str:
+    return re.sub(r"[^A-Z0-9]", "", value.upper())
+
+def normalize_phone(value: str) -> str:
+    return re.sub(r"\D", "", value)[-PHONE_KEY_DIGITS:]
+
+def normalize_name(value: str) -> str:
+    return " ".join(value.lower().split())
+
+SEARCH_NORMALIZERS = {"search_plate": normalize_plate, "search_phone": normalize_phone, "search_name": normalize_name}
+
+def search_keys(fields: dict) -> dict:
+    # Keys for whichever source fields are present, for inserts and partial updates alike
+    return {
+        key: SEARCH_NORMALIZERS[key](fields[source])
+        for source, key in SEARCH_SOURCE_FIELDS.items()
+        if fields.get(source) is not None
+    }
+
+def search_clauses(q: str) -> List[dict]:
+    # Plates and phones match anywhere (people type the last digits); names match at a word start
+    clauses = []
+    plate = normalize_plate(q)
+    if len(plate) >= 2:
+        clauses.append({"search_plate": {"$regex": re.escape(plate)}})
+    phone = normalize_phone(q)
+    if len(phone) >= 3:
+        clauses.append({"search_phone": {"$regex": re.escape(phone)}})
+    name = normalize_name(q)
+    if len(name) >= 2:
+        clauses.append({"search_name": {"$regex": f"(^| ){re.escape(name)}"}})
+    return clauses
+
+# ============ CUSTOMER PROFILES ============
+# vehicles and customers are per-workshop summaries keyed by the normalized plate and phone.
+# They are maintained with $inc upserts alongside job writes (like analytics_rollups) and can
+# be rebuilt from jobs with `manage.py rebuild-profiles`. lifetime_value sums estimated_amount.
+
+PROFILES = {
+    # collection: (key field, job search key, display fields copied from the latest job)
+    "vehicles": ("plate", "search_plate", ["vehicle_number", "car_model", "customer_name", "phone"]),
+    "customers": ("phone", "search_phone", ["customer_name"]),
+}
+
+def profile_updates(jobs: List[dict], sign: int = 1) -> Dict[str, list]:
+    # Merges the jobs into one upsert per profile; sign=-1 removes the jobs' contribution and
+    # deletes profiles left without jobs. Display fields are only written when the job is the
+    # profile's latest visit, so edits to old jobs and historical imports don't overwrite them.
+    grouped = {}
+    for job in jobs:
+        for collection, (key_field, job_key, fields) in PROFILES.items():
+            key = job.get(job_key)
+            if not key:
+                continue
+            entry = grouped.get((collection, key))
+            if entry is None:
+                entry = grouped[(collection, key)] = {
+                    "workshop_id": job["workshop_id"], "job_count": 0, "lifetime_value": 0,
+                    "first_visit": job["created_at"], "last_visit": job["created_at"],
+                    "display": {}, "plates": set()
+                }
+            entry["job_count"] += sign
+            entry["lifetime_value"] += sign * job["estimated_amount"]
+            entry["first_visit"] = min(entry["first_visit"], job["created_at"])
+            if job["created_at"] >= entry["last_visit"]:
+                entry["last_visit"] = job["created_at"]
+                entry["display"] = {field: job[field] for field in fields if job.get(field) is not None}
+            if collection == "customers" and job.get("search_plate"):
+                entry["plates"].add(job["search_plate"])
+
+    updates = {}
+    for (collection, key), entry in grouped.items():
+        profile = {"workshop_id": entry["workshop_id"], PROFILES[collection][0]: key}
+        inc = {"$inc": {"job_count": entry["job_count"], "lifetime_value": entry["lifetime_value"]}}
+        ops = updates.setdefault(collection, [])
+        if sign < 0:
+            ops.append(UpdateOne(profile, inc))
+            ops.append(DeleteOne({**profile, "job_count": {"$lte": 0}}))
+            continue
+        update = {**inc, "$min": {"first_visit": entry["first_visit"]}, "$max": {"last_visit": entry["last_visit"]}}
+        if entry["plates"]:
+            # Plates seen with this phone; moving a job to another plate does not remove the old one
+            update["$addToSet"] = {"plates": {"$each": sorted(entry["plates"])}}
+        ops.append(UpdateOne(profile, update, upsert=True))
+        if entry["display"]:
+            ops.append(UpdateOne({**profile, "last_visit": entry["last_visit"]}, {"$set": entry["display"]}))
+    return updates
+
+def profile_change_updates(before: dict, update_data: dict) -> Dict[str, list]:
+    # An edit is applied as "remove the old job, add the new one" when it touches a key or the
+    # amount; display-only edits just refresh the profile's copy of those fields
+    after = {**before, **update_data}
+    touched = {"estimated_amount", "search_plate", "search_phone"} & set(update_data)
+    if any(after.get(field) != before.get(field) for field in touched):
+        updates = profile_updates([before], sign=-1)
+        for collection, ops in profile_updates([after]).items():
+            updates.setdefault(collection, []).extend(ops)
+        return updates
+
+    updates = {}
+    for collection, (key_field, job_key, fields) in PROFILES.items():
+        display = {field: update_data[field] for field in fields if field in update_data}
+        if display and after.get(job_key):
+            updates[collection] = [UpdateOne(
+                {"workshop_id": after["workshop_id"], key_field: after[job_key], "last_visit": after["created_at"]},
+                {"$set": display}
+            )]
+    return updates
+
+async def apply_profile_updates(updates: Dict[str, list], session=None):
+    # Ordered: each profile's display and delete ops depend on its preceding $inc
+    for collection, ops in updates.items():
+        await db[collection].bulk_write(ops, session=session)
+
+# ============ JOB WRITES ============
+# Each mutation's writes take a session so routes can run them in one transaction
+# (see run_in_transaction); `manage.py benchmark-writes` times them with and without one.
+# The job_updates entry is added to audit_log once the transaction has committed.
+
+def due_date(created_at: str, planned_completion_days: int) -> str:
+    return (datetime.fromisoformat(created_at) + timedelta(days=planned_completion_days)).isoformat()
+
+def build_job(job_data: JobCreate, workshop_id: str, manager_id: str) -> dict:
+    created_at = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "workshop_id": workshop_id,
+        "manager_id": manager_id,
+        **job_data.model_dump(),
+        "status": JobStatus.PENDING,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "due_at": due_date(created_at, job_data.planned_completion_days),
+        "completed_at": None,
+        "total_paid": 0,
+        "confirmed_paid": 0,
+        "payment_count": 0,
+        **search_keys(job_data.model_dump())
+    }
+
+def build_payment(payment_data: PaymentCreate, workshop_id: str, collected_by: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "job_id": payment_data.job_id,
+        "workshop_id": workshop_id,
+        "amount": payment_data.amount,
+        "payment_type": payment_data.payment_type,
+        "notes": payment_data.notes,
+        "collected_by_manager_id": collected_by,
+        "confirmed_by_owner": False,
+        "payment_date": datetime.now(timezone.utc).isoformat(),
+        "confirmation_date": None
+    }
+
+def build_job_update(job_id: str, updated_by: str, update_type: str, description: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "job_id": job_id,
+        "updated_by": updated_by,
+        "update_type": update_type,
+        "description": description,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+async def write_new_job(job: dict, session=None):
+    await db.jobs.insert_one(job, session=session)
+    await apply_rollup(job["workshop_id"], job_rollup_inc(job), session=session)
+    await apply_profile_updates(profile_updates([job]), session=session)
+
+async def write_job_update(job_id: str, update_data: dict, session=None) -> Optional[dict]:
+    before = await db.jobs.find_one_and_update(
+        {"id": job_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if before:
+        await apply_rollup(before["workshop_id"], job_update_rollup_inc(before, update_data), session=session)
+        await apply_profile_updates(profile_change_updates(before, update_data), session=session)
+    return before
+
+async def write_payment(payment: dict, session=None):
+    await db.payments.insert_one(payment, session=session)
+    await db.jobs.update_one(
+        {"id": payment["job_id"]},
+        {"$inc": {"total_paid": payment["amount"], "payment_count": 1}},
+        session=session
+    )
+    await apply_rollup(payment["workshop_id"], {"total_collected": payment["amount"]}, session=session)
+
+JOB_TOTAL_FIELDS = ("total_paid", "confirmed_paid", "payment_count")
+
+async def job_payment_totals(job_ids: List[str]) -> Dict[str, dict]:
+    rows = await db.payments.aggregate([
+        {"$match": {"job_id": {"$in": job_ids}}},
+        {"$group": {
+            "_id": "$job_id",
+            "total_paid": {"$sum": "$amount"},
+            "confirmed_paid": {"$sum": {"$cond": ["$confirmed_by_owner", "$amount", 0]}},
+            "payment_count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+    actual = {row["_id"]: row for row in rows}
+    return {job_id: {field: actual.get(job_id, {}).get(field, 0) for field in JOB_TOTAL_FIELDS} for job_id in job_ids}
+
+async def write_job_totals(job_ids: List[str]) -> int:
+    totals = await job_payment_totals(job_ids)
+    result = await db.jobs.bulk_write([
+        UpdateOne({"id": job_id, "total_paid": {"$exists": False}}, {"$set": fresh})
+        for job_id, fresh in totals.items()
+    ], ordered=False)
+    return result.modified_count
+
+async def backfill_job_totals() -> int:
+    # Jobs created before totals were stored on the job would read as unpaid (and take a partial
+    # total from their next payment's $inc), so they are filled in before the app serves requests
+    filled = 0
+    cursor = db.jobs.find({"total_paid": {"$exists": False}}, {"_id": 0, "id": 1}).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for job in cursor:
+        batch.append(job["id"])
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            filled += await write_job_totals(batch)
+            batch = []
+    if batch:
+        filled += await write_job_totals(batch)
+    return filled
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register")
@@ -189,11 +1400,12 @@ async def register(user_data: UserRegister):
             "is_active": True,
             "permissions": {}
         })
+        change_counter.bump(workshop_id)
 
     user = {
         "id": user_id,
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await bcrypt_pool.run(hash_password, user_data.password),
         "name": user_data.name,
         "phone": user_data.phone,
         "role": user_data.role,
@@ -217,18 +1429,14 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user or not await bcrypt_pool.run(verify_password, credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    workshop_id = None
-    if user["role"] == UserRole.MANAGER:
-        manager = await db.managers.find_one({"user_id": user["id"], "is_active": True}, {"_id": 0})
-        if manager:
-            workshop_id = manager["workshop_id"]
-    elif user["role"] == UserRole.OWNER:
-        workshop = await db.workshops.find_one({"owner_id": user["id"]}, {"_id": 0})
-        if workshop:
-            workshop_id = workshop["id"]
+    if password_needs_rehash(user["password_hash"]):
+        new_hash = await bcrypt_pool.run(hash_password, credentials.password)
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": new_hash}})
+
+    workshop_id = await resolve_workshop_id(user)
 
     token = create_access_token({"sub": user["id"], "email": user["email"], "role": user["role"]})
 
@@ -245,22 +1453,12 @@ async def login(credentials: UserLogin):
 
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    workshop_id = None
-    if current_user["role"] == UserRole.MANAGER:
-        manager = await db.managers.find_one({"user_id": current_user["id"], "is_active": True}, {"_id": 0})
-        if manager:
-            workshop_id = manager["workshop_id"]
-    elif current_user["role"] == UserRole.OWNER:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if workshop:
-            workshop_id = workshop["id"]
-
     return {
         "id": current_user["id"],
         "email": current_user["email"],
         "name": current_user["name"],
         "role": current_user["role"],
-        "workshop_id": workshop_id
+        "workshop_id": current_user["workshop_id"]
     }
 
 # ============ WORKSHOP ROUTES ============
@@ -270,8 +1468,7 @@ async def create_workshop(workshop_data: WorkshopCreate, current_user: dict = De
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can create workshops")
 
-    existing = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if existing:
+    if current_user["workshop_id"]:
         raise HTTPException(status_code=400, detail="You already have a workshop")
 
     workshop = {
@@ -284,18 +1481,14 @@ async def create_workshop(workshop_data: WorkshopCreate, current_user: dict = De
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.workshops.insert_one(workshop)
+    principal_cache.invalidate(current_user["id"])
 
     return {"id": workshop["id"], **workshop_data.model_dump()}
 
 @api_router.get("/workshops/me")
 async def get_my_workshop(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] == UserRole.OWNER:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    else:
-        manager = await db.managers.find_one({"user_id": current_user["id"], "is_active": True}, {"_id": 0})
-        if not manager:
-            raise HTTPException(status_code=404, detail="Manager record not found")
-        workshop = await db.workshops.find_one({"id": manager["workshop_id"]}, {"_id": 0})
+    workshop_id = require_workshop(current_user)
+    workshop = await db.workshops.find_one({"id": workshop_id}, {"_id": 0})
 
     if not workshop:
         raise HTTPException(status_code=404, detail="Workshop not found")
@@ -306,13 +1499,14 @@ async def update_workshop(workshop_id: str, workshop_data: WorkshopUpdate, curre
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can update workshops")
 
-    workshop = await db.workshops.find_one({"id": workshop_id, "owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
+    if workshop_id != current_user["workshop_id"]:
         raise HTTPException(status_code=404, detail="Workshop not found")
 
     update_data = {k: v for k, v in workshop_data.model_dump().items() if v is not None}
     if update_data:
         await db.workshops.update_one({"id": workshop_id}, {"$set": update_data})
+        principal_cache.invalidate(current_user["id"])
+        change_counter.bump(workshop_id)
 
     return {"message": "Workshop updated successfully"}
 
@@ -321,8 +1515,7 @@ async def create_invite_code(workshop_id: str, current_user: dict = Depends(get_
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can create invite codes")
 
-    workshop = await db.workshops.find_one({"id": workshop_id, "owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
+    if workshop_id != current_user["workshop_id"]:
         raise HTTPException(status_code=404, detail="Workshop not found")
 
     code = str(uuid.uuid4())[:8].upper()
@@ -337,6 +1530,7 @@ async def create_invite_code(workshop_id: str, current_user: dict = Depends(get_
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.invite_codes.insert_one(invite)
+    change_counter.bump(workshop_id)
 
     return {"code": code, "created_at": invite["created_at"]}
 
@@ -355,16 +1549,17 @@ async def get_managers(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can view managers")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
+    if not current_user["workshop_id"]:
         return []
 
-    managers = await db.managers.find({"workshop_id": workshop["id"], "is_active": True}, {"_id": 0}).to_list(1000)
+    managers = await db.managers.find({"workshop_id": current_user["workshop_id"], "is_active": True}, {"_id": 0}).to_list(1000)
 
+    user_ids = [m["user_id"] for m in managers]
+    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "password_hash": 0}).to_list(len(user_ids))
+    users_by_id = {u["id"]: u for u in users}
     for manager in managers:
-        user = await db.users.find_one({"id": manager["user_id"]}, {"_id": 0, "password_hash": 0})
-        if user:
-            manager["user"] = user
+        if manager["user_id"] in users_by_id:
+            manager["user"] = users_by_id[manager["user_id"]]
 
     return managers
 
@@ -373,18 +1568,20 @@ async def remove_manager(manager_id: str, current_user: dict = Depends(get_curre
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can remove managers")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
-        raise HTTPException(status_code=404, detail="Workshop not found")
+    workshop_id = require_workshop(current_user)
 
-    result = await db.managers.update_one(
-        {"id": manager_id, "workshop_id": workshop["id"]},
-        {"$set": {"is_active": False}}
+    manager = await db.managers.find_one_and_update(
+        {"id": manager_id, "workshop_id": workshop_id, "is_active": True},
+        {"$set": {"is_active": False}},
+        projection={"_id": 0, "user_id": 1}
     )
 
-    if result.modified_count == 0:
+    if not manager:
         raise HTTPException(status_code=404, detail="Manager not found")
 
+    principal_cache.invalidate(manager["user_id"])
+    change_counter.bump(workshop_id)
+
     return {"message": "Manager removed successfully"}
 
 # ============ JOB ROUTES ============
@@ -394,107 +1591,143 @@ async def create_job(job_data: JobCreate, current_user: dict = Depends(get_curre
     if current_user["role"] != UserRole.MANAGER:
         raise HTTPException(status_code=403, detail="Only managers can create jobs")
 
-    manager = await db.managers.find_one({"user_id": current_user["id"], "is_active": True}, {"_id": 0})
-    if not manager:
-        raise HTTPException(status_code=404, detail="Manager record not found")
-
-    job = {
-        "id": str(uuid.uuid4()),
-        "workshop_id": manager["workshop_id"],
-        "manager_id": current_user["id"],
-        **job_data.model_dump(),
-        "status": JobStatus.PENDING,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat(),
-        "completed_at": None
-    }
-    await db.jobs.insert_one(job)
-
-    await db.job_updates.insert_one({
-        "id": str(uuid.uuid4()),
-        "job_id": job["id"],
-        "updated_by": current_user["id"],
-        "update_type": "created",
-        "description": "Job created",
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    job = build_job(job_data, require_workshop(current_user), current_user["id"])
+    await run_in_transaction(lambda session: write_new_job(job, session))
+    change_counter.bump(job["workshop_id"])
+    audit_log.add(build_job_update(job["id"], current_user["id"], "created", "Job created"))
 
     return {"id": job["id"], "message": "Job created successfully"}
 
 @api_router.get("/jobs")
 async def get_jobs(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     manager_id: Optional[str] = None,
+    worker_assigned: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    completed_from: Optional[str] = None,
+    completed_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    overdue: Optional[bool] = None,
+    sort: str = "-created_at",
+    fields: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    query = {}
+    not_modified = conditional_get(request, response, current_user)
+    if not_modified:
+        return not_modified
+
+    sort_field, direction = parse_sort(sort, JOB_SORT_FIELDS)
+    projection = list_projection(fields, JOB_SUMMARY_FIELDS, JOB_FIELDS, JOB_COMPUTED_FIELDS, JOB_PROJECTION, sort_field)
+    query = {"workshop_id": require_workshop(current_user)}
 
     if current_user["role"] == UserRole.MANAGER:
-        manager = await db.managers.find_one({"user_id": current_user["id"], "is_active": True}, {"_id": 0})
-        if not manager:
-            raise HTTPException(status_code=404, detail="Manager record not found")
-        query["workshop_id"] = manager["workshop_id"]
         query["manager_id"] = current_user["id"]
     else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop:
-            raise HTTPException(status_code=404, detail="Workshop not found")
-        query["workshop_id"] = workshop["id"]
         if manager_id:
             query["manager_id"] = manager_id
 
     if status:
         query["status"] = status
+    if worker_assigned:
+        query["worker_assigned"] = worker_assigned
 
-    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
+    add_range_filters(query, {
+        "created_at": date_range_query(created_from, created_to),
+        "completed_at": date_range_query(completed_from, completed_to),
+        "estimated_amount": amount_range_query(min_amount, max_amount)
+    })
+    if overdue is not None:
+        query = {"$and": [query, overdue_query(overdue)]}
 
-    for job in jobs:
-        manager_user = await db.users.find_one({"id": job["manager_id"]}, {"_id": 0, "password_hash": 0})
-        if manager_user:
-            job["manager_name"] = manager_user["name"]
+    jobs, next_cursor = await fetch_page(db.jobs, query, projection, sort_field, direction, limit, cursor)
 
-        payments = await db.payments.find({"job_id": job["id"]}, {"_id": 0}).to_list(1000)
-        total_paid = sum(p["amount"] for p in payments)
-        job["total_paid"] = total_paid
-        job["remaining_amount"] = job["estimated_amount"] - total_paid
+    await enrich_jobs(jobs)
 
-    return jobs
+    return {"jobs": jobs, "next_cursor": next_cursor}
+
+@api_router.get("/jobs/search")
+async def search_jobs(
+    q: str = Query(..., min_length=2),
+    fields: Optional[str] = None,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    current_user: dict = Depends(get_current_user)
+):
+    projection = list_projection(fields, JOB_SUMMARY_FIELDS, JOB_FIELDS, JOB_COMPUTED_FIELDS, JOB_PROJECTION, "created_at")
+    clauses = search_clauses(q)
+    if not clauses:
+        return {"jobs": []}
+
+    # workshop_id goes inside each $or branch so every branch can use its own compound index
+    workshop_id = require_workshop(current_user)
+    query = {"$or": [{"workshop_id": workshop_id, **clause} for clause in clauses]}
+    if current_user["role"] == UserRole.MANAGER:
+        query["manager_id"] = current_user["id"]
+
+    jobs = await db.jobs.find(query, projection).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit).to_list(limit)
+
+    await enrich_jobs(jobs)
+
+    return {"jobs": jobs}
 
 @api_router.get("/jobs/{job_id}")
 async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    job = await db.jobs.find_one({"id": job_id}, JOB_PROJECTION)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    check_job_access(job, current_user)
+
+    payments, updates, update_count = await asyncio.gather(
+        db.payments.find({"job_id": job_id}, {"_id": 0}).sort(
+            "payment_date", -1
+        ).limit(JOB_HISTORY_LIMIT).to_list(JOB_HISTORY_LIMIT),
+        db.job_updates.find({"job_id": job_id}, {"_id": 0}).sort(
+            [("timestamp", -1), ("id", -1)]
+        ).limit(JOB_HISTORY_LIMIT).to_list(JOB_HISTORY_LIMIT),
+        db.job_updates.count_documents({"job_id": job_id})
+    )
 
-    if current_user["role"] == UserRole.MANAGER:
-        if job["manager_id"] != current_user["id"]:
-            raise HTTPException(status_code=403, detail="Access denied")
-    else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop or job["workshop_id"] != workshop["id"]:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-    payments = await db.payments.find({"job_id": job_id}, {"_id": 0}).to_list(1000)
-    total_paid = sum(p["amount"] for p in payments)
-
-    updates = await db.job_updates.find({"job_id": job_id}, {"_id": 0}).sort("timestamp", -1).to_list(1000)
-
+    add_remaining_amount(job)
+    if "payment_count" not in job:
+        # Jobs written before the counter existed; payments above is capped, so count them
+        job["payment_count"] = await db.payments.count_documents({"job_id": job_id})
     job["payments"] = payments
-    job["total_paid"] = total_paid
-    job["remaining_amount"] = job["estimated_amount"] - total_paid
     job["updates"] = updates
+    job["update_count"] = update_count
 
     return job
 
+@api_router.get("/jobs/{job_id}/updates")
+async def get_job_updates(
+    job_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "manager_id": 1, "workshop_id": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    check_job_access(job, current_user)
+
+    updates, next_cursor = await fetch_page(
+        db.job_updates, {"job_id": job_id}, {"_id": 0}, "timestamp", -1, limit, cursor
+    )
+
+    return {"updates": updates, "next_cursor": next_cursor}
+
 @api_router.put("/jobs/{job_id}")
 async def update_job(job_id: str, job_data: JobUpdate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] == UserRole.MANAGER:
         job = await db.jobs.find_one({"id": job_id, "manager_id": current_user["id"]}, {"_id": 0})
     else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop:
-            raise HTTPException(status_code=404, detail="Workshop not found")
-        job = await db.jobs.find_one({"id": job_id, "workshop_id": workshop["id"]}, {"_id": 0})
+        job = await db.jobs.find_one({"id": job_id, "workshop_id": require_workshop(current_user)}, {"_id": 0})
 
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -506,20 +1739,76 @@ async def update_job(job_id: str, job_data: JobUpdate, current_user: dict = Depe
         if not job.get("completed_at"):
             update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
 
-    if update_data:
-        await db.jobs.update_one({"id": job_id}, {"$set": update_data})
+    if job_data.planned_completion_days is not None:
+        update_data["due_at"] = due_date(job["created_at"], job_data.planned_completion_days)
 
-        await db.job_updates.insert_one({
-            "id": str(uuid.uuid4()),
-            "job_id": job_id,
-            "updated_by": current_user["id"],
-            "update_type": "modified",
-            "description": f"Job updated: {', '.join(update_data.keys())}",
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+    description = f"Job updated: {', '.join(update_data.keys())}"
+    update_data.update(search_keys(update_data))
+
+    if update_data:
+        before = await run_in_transaction(lambda session: write_job_update(job_id, update_data, session))
+        change_counter.bump(job["workshop_id"])
+        if before:
+            audit_log.add(build_job_update(job_id, current_user["id"], "modified", description))
 
     return {"message": "Job updated successfully"}
 
+# ============ CUSTOMER ROUTES ============
+
+def profile_from_jobs(collection: str, key: str, workshop_id: str, jobs: List[dict]) -> dict:
+    # The same shape as a stored profile, built only from the given jobs (newest first)
+    key_field, _, fields = PROFILES[collection]
+    profile = {
+        "workshop_id": workshop_id,
+        key_field: key,
+        "job_count": len(jobs),
+        "lifetime_value": sum(job["estimated_amount"] for job in jobs),
+        "first_visit": jobs[-1]["created_at"],
+        "last_visit": jobs[0]["created_at"],
+        **{field: jobs[0][field] for field in fields if jobs[0].get(field) is not None}
+    }
+    if collection == "customers":
+        profile["plates"] = sorted({normalize_plate(job["vehicle_number"]) for job in jobs})
+    return profile
+
+async def profile_history(collection: str, value: str, current_user: dict, not_found: str) -> dict:
+    # Managers only see their own jobs, so their profile is recomputed from those rather than
+    # returning the workshop-wide totals
+    key_field, job_key, _ = PROFILES[collection]
+    key = SEARCH_NORMALIZERS[job_key](value)
+    workshop_id = require_workshop(current_user)
+
+    is_manager = current_user["role"] == UserRole.MANAGER
+    query = {"workshop_id": workshop_id, job_key: key}
+    if is_manager:
+        query["manager_id"] = current_user["id"]
+    jobs_cursor = db.jobs.find(query, JOB_PROJECTION).sort([("created_at", -1), ("id", -1)])
+
+    if is_manager:
+        jobs = await jobs_cursor.to_list(None)
+        if not jobs:
+            raise HTTPException(status_code=404, detail=not_found)
+        profile = profile_from_jobs(collection, key, workshop_id, jobs)
+    else:
+        profile, jobs = await asyncio.gather(
+            db[collection].find_one({"workshop_id": workshop_id, key_field: key}, {"_id": 0}),
+            jobs_cursor.to_list(None)
+        )
+        if not profile and not jobs:
+            raise HTTPException(status_code=404, detail=not_found)
+
+    await enrich_jobs(jobs)
+
+    return {"profile": profile, "jobs": jobs}
+
+@api_router.get("/vehicles/{vehicle_number}/history")
+async def get_vehicle_history(vehicle_number: str, current_user: dict = Depends(get_current_user)):
+    return await profile_history("vehicles", vehicle_number, current_user, "Vehicle not found")
+
+@api_router.get("/customers/{phone}/history")
+async def get_customer_history(phone: str, current_user: dict = Depends(get_current_user)):
+    return await profile_history("customers", phone, current_user, "Customer not found")
+
 # ============ PAYMENT ROUTES ============
 
 @api_router.post("/payments")
@@ -527,44 +1816,44 @@ async def create_payment(payment_data: PaymentCreate, current_user: dict = Depen
     if current_user["role"] == UserRole.MANAGER:
         job = await db.jobs.find_one({"id": payment_data.job_id, "manager_id": current_user["id"]}, {"_id": 0})
     else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop:
-            raise HTTPException(status_code=404, detail="Workshop not found")
-        job = await db.jobs.find_one({"id": payment_data.job_id, "workshop_id": workshop["id"]}, {"_id": 0})
+        job = await db.jobs.find_one({"id": payment_data.job_id, "workshop_id": require_workshop(current_user)}, {"_id": 0})
 
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    payment = {
-        "id": str(uuid.uuid4()),
-        "job_id": payment_data.job_id,
-        "amount": payment_data.amount,
-        "payment_type": payment_data.payment_type,
-        "notes": payment_data.notes,
-        "collected_by_manager_id": current_user["id"],
-        "confirmed_by_owner": False,
-        "payment_date": datetime.now(timezone.utc).isoformat(),
-        "confirmation_date": None
-    }
-    await db.payments.insert_one(payment)
-
-    await db.job_updates.insert_one({
-        "id": str(uuid.uuid4()),
-        "job_id": payment_data.job_id,
-        "updated_by": current_user["id"],
-        "update_type": "payment",
-        "description": f"Payment of {payment_data.amount} recorded",
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    payment = build_payment(payment_data, job["workshop_id"], current_user["id"])
+    await run_in_transaction(lambda session: write_payment(payment, session))
+    change_counter.bump(job["workshop_id"])
+    audit_log.add(build_job_update(job["id"], current_user["id"], "payment", f"Payment of {payment_data.amount} recorded"))
 
     return {"id": payment["id"], "message": "Payment recorded successfully"}
 
 @api_router.get("/payments")
 async def get_payments(
+    request: Request,
+    response: Response,
     job_id: Optional[str] = None,
     confirmed: Optional[bool] = None,
+    manager_id: Optional[str] = None,
+    payment_type: Optional[str] = None,
+    paid_from: Optional[str] = None,
+    paid_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    sort: str = "-payment_date",
+    fields: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    not_modified = conditional_get(request, response, current_user)
+    if not_modified:
+        return not_modified
+
+    sort_field, direction = parse_sort(sort, PAYMENT_SORT_FIELDS)
+    projection = list_projection(
+        fields, PAYMENT_SUMMARY_FIELDS, PAYMENT_FIELDS, PAYMENT_COMPUTED_FIELDS, {"_id": 0}, sort_field
+    )
     query = {}
 
     if job_id:
@@ -573,32 +1862,63 @@ async def get_payments(
     if confirmed is not None:
         query["confirmed_by_owner"] = confirmed
 
+    if payment_type:
+        query["payment_type"] = payment_type
+
     if current_user["role"] == UserRole.MANAGER:
         query["collected_by_manager_id"] = current_user["id"]
     else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop:
-            return []
+        if not current_user["workshop_id"]:
+            return {"payments": [], "next_cursor": None}
+        query["workshop_id"] = current_user["workshop_id"]
+        if manager_id:
+            query["collected_by_manager_id"] = manager_id
+
+    add_range_filters(query, {
+        "payment_date": date_range_query(paid_from, paid_to),
+        "amount": amount_range_query(min_amount, max_amount)
+    })
 
-        jobs = await db.jobs.find({"workshop_id": workshop["id"]}, {"_id": 0, "id": 1}).to_list(10000)
-        job_ids = [j["id"] for j in jobs]
-        query["job_id"] = {"$in": job_ids}
+    payments, next_cursor = await fetch_page(db.payments, query, projection, sort_field, direction, limit, cursor)
 
-    payments = await db.payments.find(query, {"_id": 0}).sort("payment_date", -1).to_list(10000)
+    await enrich_payments(payments)
 
-    for payment in payments:
-        job = await db.jobs.find_one({"id": payment["job_id"]}, {"_id": 0})
-        if job:
-            payment["job"] = {
-                "customer_name": job["customer_name"],
-                "vehicle_number": job["vehicle_number"]
-            }
+    return {"payments": payments, "next_cursor": next_cursor}
 
-        manager = await db.users.find_one({"id": payment["collected_by_manager_id"]}, {"_id": 0, "password_hash": 0})
-        if manager:
-            payment["manager_name"] = manager["name"]
+@api_router.put("/payments/confirm")
+async def confirm_payments(body: PaymentBulkConfirm, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != UserRole.OWNER:
+        raise HTTPException(status_code=403, detail="Only owners can confirm payments")
 
-    return payments
+    workshop_id = require_workshop(current_user)
+    query = {}
+    if body.job_id:
+        query["job_id"] = body.job_id
+    if body.manager_id:
+        query["collected_by_manager_id"] = body.manager_id
+    if body.paid_before:
+        query["payment_date"] = {"$lt": parse_date_bound(body.paid_before)}
+    ids = bulk_confirm_ids(body.ids, query)
+
+    async def confirm(session):
+        results, confirmed, has_more = await confirm_many(
+            "payments", ids, query, workshop_id, {"job_id": 1, "amount": 1}, session=session
+        )
+        if confirmed:
+            per_job = {}
+            for payment in confirmed:
+                per_job[payment["job_id"]] = per_job.get(payment["job_id"], 0) + payment["amount"]
+            await db.jobs.bulk_write(
+                [UpdateOne({"id": job_id}, {"$inc": {"confirmed_paid": amount}}) for job_id, amount in per_job.items()],
+                ordered=False,
+                session=session
+            )
+            await apply_rollup(workshop_id, {"confirmed_collected": sum(per_job.values())}, session=session)
+        return results, len(confirmed), has_more
+
+    results, confirmed_count, has_more = await run_in_transaction(confirm)
+    change_counter.bump(workshop_id)
+    return {"confirmed": confirmed_count, "has_more": has_more, "results": results}
 
 @api_router.put("/payments/{payment_id}/confirm")
 async def confirm_payment(payment_id: str, current_user: dict = Depends(get_current_user)):
@@ -609,21 +1929,34 @@ async def confirm_payment(payment_id: str, current_user: dict = Depends(get_curr
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
 
-    job = await db.jobs.find_one({"id": payment["job_id"]}, {"_id": 0})
+    job = await db.jobs.find_one({"id": payment["job_id"]}, {"_id": 0, "workshop_id": 1})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop or job["workshop_id"] != workshop["id"]:
+    if job["workshop_id"] != current_user["workshop_id"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    await db.payments.update_one(
-        {"id": payment_id},
-        {"$set": {
-            "confirmed_by_owner": True,
-            "confirmation_date": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    confirmation_date = datetime.now(timezone.utc).isoformat()
+
+    async def flip_confirmed(session):
+        result = await db.payments.update_one(
+            {"id": payment_id, "confirmed_by_owner": False},
+            {"$set": {
+                "confirmed_by_owner": True,
+                "confirmation_date": confirmation_date
+            }},
+            session=session
+        )
+        if result.modified_count:
+            await db.jobs.update_one(
+                {"id": payment["job_id"]},
+                {"$inc": {"confirmed_paid": payment["amount"]}},
+                session=session
+            )
+            await apply_rollup(job["workshop_id"], {"confirmed_collected": payment["amount"]}, session=session)
+
+    await run_in_transaction(flip_confirmed)
+    change_counter.bump(job["workshop_id"])
 
     return {"message": "Payment confirmed successfully"}
 
@@ -634,14 +1967,12 @@ async def create_settlement(settlement_data: SettlementCreate, current_user: dic
     if current_user["role"] != UserRole.MANAGER:
         raise HTTPException(status_code=403, detail="Only managers can submit settlements")
 
-    manager = await db.managers.find_one({"user_id": current_user["id"], "is_active": True}, {"_id": 0})
-    if not manager:
-        raise HTTPException(status_code=404, detail="Manager record not found")
+    workshop_id = require_workshop(current_user)
 
     settlement = {
         "id": str(uuid.uuid4()),
         "manager_id": current_user["id"],
-        "workshop_id": manager["workshop_id"],
+        "workshop_id": workshop_id,
         "amount": settlement_data.amount,
         "job_ids": settlement_data.job_ids,
         "notes": settlement_data.notes,
@@ -650,14 +1981,21 @@ async def create_settlement(settlement_data: SettlementCreate, current_user: dic
         "confirmation_date": None
     }
     await db.settlements.insert_one(settlement)
+    change_counter.bump(workshop_id)
 
     return {"id": settlement["id"], "message": "Settlement submitted successfully"}
 
 @api_router.get("/settlements")
 async def get_settlements(
+    request: Request,
+    response: Response,
     confirmed: Optional[bool] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    not_modified = conditional_get(request, response, current_user)
+    if not_modified:
+        return not_modified
+
     query = {}
 
     if confirmed is not None:
@@ -666,20 +2004,36 @@ async def get_settlements(
     if current_user["role"] == UserRole.MANAGER:
         query["manager_id"] = current_user["id"]
     else:
-        workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-        if not workshop:
+        if not current_user["workshop_id"]:
             return []
-        query["workshop_id"] = workshop["id"]
+        query["workshop_id"] = current_user["workshop_id"]
 
     settlements = await db.settlements.find(query, {"_id": 0}).sort("submitted_date", -1).to_list(10000)
 
+    manager_names = await get_user_names(s["manager_id"] for s in settlements)
     for settlement in settlements:
-        manager = await db.users.find_one({"id": settlement["manager_id"]}, {"_id": 0, "password_hash": 0})
-        if manager:
-            settlement["manager_name"] = manager["name"]
+        if settlement["manager_id"] in manager_names:
+            settlement["manager_name"] = manager_names[settlement["manager_id"]]
 
     return settlements
 
+@api_router.put("/settlements/confirm")
+async def confirm_settlements(body: SettlementBulkConfirm, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != UserRole.OWNER:
+        raise HTTPException(status_code=403, detail="Only owners can confirm settlements")
+
+    workshop_id = require_workshop(current_user)
+    query = {}
+    if body.manager_id:
+        query["manager_id"] = body.manager_id
+    if body.submitted_before:
+        query["submitted_date"] = {"$lt": parse_date_bound(body.submitted_before)}
+    ids = bulk_confirm_ids(body.ids, query)
+
+    results, confirmed, has_more = await confirm_many("settlements", ids, query, workshop_id, {})
+    change_counter.bump(workshop_id)
+    return {"confirmed": len(confirmed), "has_more": has_more, "results": results}
+
 @api_router.put("/settlements/{settlement_id}/confirm")
 async def confirm_settlement(settlement_id: str, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != UserRole.OWNER:
@@ -689,8 +2043,7 @@ async def confirm_settlement(settlement_id: str, current_user: dict = Depends(ge
     if not settlement:
         raise HTTPException(status_code=404, detail="Settlement not found")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop or settlement["workshop_id"] != workshop["id"]:
+    if settlement["workshop_id"] != current_user["workshop_id"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
     await db.settlements.update_one(
@@ -700,126 +2053,449 @@ async def confirm_settlement(settlement_id: str, current_user: dict = Depends(ge
             "confirmation_date": datetime.now(timezone.utc).isoformat()
         }}
     )
+    change_counter.bump(settlement["workshop_id"])
 
     return {"message": "Settlement confirmed successfully"}
 
+# ============ EXPORT UTILITIES ============
+
+EXPORT_COLUMNS = [
+    ("Job ID", "id"),
+    ("Customer Name", "customer_name"),
+    ("Phone", "phone"),
+    ("Vehicle Number", "vehicle_number"),
+    ("Car Model", "car_model"),
+    ("Work Description", "work_description"),
+    ("Estimated Amount", "estimated_amount"),
+    ("Advance Paid", "advance_paid"),
+    ("Status", "status"),
+    ("Created At", "created_at"),
+    ("Completed At", "completed_at"),
+    ("Total Paid", "total_paid"),
+    ("Remaining Amount", "remaining_amount"),
+]
+EXPORT_COMPUTED_FIELDS = {"remaining_amount"}
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+async def iter_export_jobs(cursor):
+    async for job in cursor:
+        yield add_remaining_amount(job)
+
+async def write_jobs_xlsx(jobs) -> str:
+    # constant_memory flushes each row to a temp file as soon as the next row starts,
+    # so worker memory stays flat however many jobs the cursor yields
+    fd, path = tempfile.mkstemp(prefix="revops_export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Jobs")
+        worksheet.write_row(0, 0, [header for header, _ in EXPORT_COLUMNS])
+
+        row = 1
+        async for job in jobs:
+            worksheet.write_row(row, 0, [job.get(field) for _, field in EXPORT_COLUMNS])
+            row += 1
+
+        await asyncio.to_thread(workbook.close)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+async def stream_jobs_csv(jobs, batch_size: int = EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    async for job in jobs:
+        writer.writerow([job.get(field) for _, field in EXPORT_COLUMNS])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+async def stream_jobs_ndjson(jobs, batch_size: int = EXPORT_BATCH_SIZE):
+    lines = []
+    async for job in jobs:
+        lines.append(json.dumps({field: job.get(field) for _, field in EXPORT_COLUMNS}))
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+async def stream_file(path: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+def export_jobs_query(
+    workshop_id: str,
+    status: Optional[str] = None,
+    manager_id: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None
+) -> dict:
+    query = {"workshop_id": workshop_id}
+    if status:
+        query["status"] = status
+    if manager_id:
+        query["manager_id"] = manager_id
+    created_range = date_range_query(created_from, created_to)
+    if created_range:
+        query["created_at"] = created_range
+    return query
+
+async def build_jobs_export(query: dict, format: str):
+    projection = {"_id": 0, **{field: 1 for _, field in EXPORT_COLUMNS if field not in EXPORT_COMPUTED_FIELDS}}
+    cursor = db.jobs.find(query, projection).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+    jobs = iter_export_jobs(cursor)
+    headers = {"Content-Disposition": f"attachment; filename=jobs_export.{format}"}
+
+    if format == "csv":
+        return stream_jobs_csv(jobs), headers
+    if format == "ndjson":
+        return stream_jobs_ndjson(jobs), headers
+
+    path = await write_jobs_xlsx(jobs)
+    headers["Content-Length"] = str(os.path.getsize(path))
+    return stream_file(path), headers
+
+async def build_invoices_zip(query: dict):
+    workshop = await db.workshops.find_one({"id": query["workshop_id"]}, {"_id": 0})
+    cursor = db.jobs.find(
+        query,
+        {"_id": 0, "id": 1, "total_paid": 1, **{field: 1 for field in INVOICE_JOB_FIELDS}}
+    ).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    return stream_invoice_zip(iter_export_jobs(cursor), workshop)
+
+# ============ JOB IMPORT ============
+
+JOB_STATUSES = [value for key, value in vars(JobStatus).items() if not key.startswith("_")]
+IMPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+async def iter_body_lines(request: Request):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    remainder = ""
+    async for chunk in request.stream():
+        lines = (remainder + decoder.decode(chunk)).split("\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    remainder += decoder.decode(b"", final=True)
+    if remainder.strip():
+        yield remainder.rstrip("\r")
+
+class NeedMoreLines(Exception):
+    pass
+
+class CsvLineFeed:
+    # Synchronous line iterator for csv.reader over lines that arrive from an async stream.
+    # Running dry mid-record raises NeedMoreLines; rewind() puts that record's lines back so
+    # a fresh reader can parse it again once more lines have arrived.
+    def __init__(self):
+        self.pending = deque()
+        self.consumed = []
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            line = self.pending.popleft()
+            self.consumed.append(line)
+            return line
+        if self.finished:
+            raise StopIteration
+        raise NeedMoreLines()
+
+    def rewind(self):
+        self.pending.extendleft(reversed(self.consumed))
+        self.consumed = []
+
+async def iter_csv_records(lines):
+    # Yields (record, error); csv.reader decides where records end, so quoted fields may span
+    # lines and stray quotes inside unquoted fields stay literal. Empty cells are dropped so
+    # JobImport defaults apply.
+    feed = CsvLineFeed()
+    reader = csv.reader(feed)
+    header = None
+
+    def parsed(values):
+        nonlocal header
+        if not any(value.strip() for value in values):
+            return None
+        if header is None:
+            header = [name.strip() for name in values]
+            return None
+        return {name: value.strip() for name, value in zip(header, values) if value.strip()}, None
+
+    async for line in lines:
+        feed.pending.append(line + "\n")
+        while feed.pending:
+            try:
+                values = next(reader)
+            except NeedMoreLines:
+                feed.rewind()
+                reader = csv.reader(feed)
+                break
+            except csv.Error as e:
+                feed.consumed = []
+                reader = csv.reader(feed)
+                yield None, f"Invalid CSV: {e}"
+                continue
+            feed.consumed = []
+            row = parsed(values)
+            if row:
+                yield row
+
+    if feed.pending:
+        yield None, "Unterminated quoted field"
+
+async def iter_ndjson_records(lines):
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield record, None
+        else:
+            yield None, "Expected a JSON object"
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
+
+def build_imported_job(data: JobImport, workshop_id: str, manager_id: str) -> dict:
+    job = build_job(data, workshop_id, manager_id)
+    job["status"] = data.status
+    for field in ("created_at", "completed_at"):
+        value = getattr(data, field)
+        if value is not None:
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            job[field] = value.astimezone(timezone.utc).isoformat()
+    job["updated_at"] = job["created_at"]
+    job["due_at"] = due_date(job["created_at"], data.planned_completion_days)
+    return job
+
+async def import_job_chunk(rows: list, workshop_id: str, manager_id: str, user_id: str):
+    # rows are (row_number, record, error); returns (imported_count, row_errors)
+    errors = []
+    jobs = []
+    for row_number, record, error in rows:
+        if error is None:
+            try:
+                data = JobImport.model_validate(record)
+            except ValidationError as e:
+                error = validation_message(e)
+            else:
+                if data.status not in JOB_STATUSES:
+                    error = f"status: must be one of {', '.join(JOB_STATUSES)}"
+        if error:
+            errors.append({"row": row_number, "error": error})
+        else:
+            jobs.append((row_number, build_imported_job(data, workshop_id, manager_id)))
+
+    if not jobs:
+        return 0, errors
+
+    failed = set()
+    try:
+        await db.jobs.insert_many([job for _, job in jobs], ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            errors.append({"row": jobs[err["index"]][0], "error": err.get("errmsg", "Insert failed")})
+
+    inserted = [job for i, (_, job) in enumerate(jobs) if i not in failed]
+    if inserted:
+        await db.job_updates.insert_many(
+            [build_job_update(job["id"], user_id, "created", "Job imported") for job in inserted],
+            ordered=False
+        )
+        await apply_rollup(workshop_id, merge_rollup_incs(job_rollup_inc(job) for job in inserted))
+        await apply_profile_updates(profile_updates(inserted))
+        change_counter.bump(workshop_id)
+    return len(inserted), errors
+
+@api_router.post("/jobs/import")
+async def import_jobs(
+    request: Request,
+    format: Optional[str] = None,
+    manager_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    workshop_id = require_workshop(current_user)
+
+    # Jobs always belong to a manager, as with create_job; owners pick which one
+    if current_user["role"] == UserRole.MANAGER:
+        manager_id = current_user["id"]
+    elif not manager_id:
+        raise HTTPException(status_code=400, detail="Owners must pass manager_id to import jobs")
+    else:
+        manager = await db.managers.find_one(
+            {"user_id": manager_id, "workshop_id": workshop_id, "is_active": True},
+            {"_id": 0, "id": 1}
+        )
+        if not manager:
+            raise HTTPException(status_code=400, detail="Manager not found in this workshop")
+
+    if not format:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        format = "ndjson" if content_type in ("application/x-ndjson", "application/jsonl") else "csv"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of: {', '.join(IMPORT_FORMATS)}")
+
+    lines = iter_body_lines(request)
+    records = iter_csv_records(lines) if format == "csv" else iter_ndjson_records(lines)
+
+    imported = 0
+    errors = []
+    chunk = []
+    row_number = 0
+    async for record, error in records:
+        row_number += 1
+        if row_number > IMPORT_MAX_ROWS:
+            errors.append({"row": row_number, "error": f"Import stopped at the {IMPORT_MAX_ROWS} row limit"})
+            break
+        chunk.append((row_number, record, error))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            count, chunk_errors = await import_job_chunk(chunk, workshop_id, manager_id, current_user["id"])
+            imported += count
+            errors += chunk_errors
+            chunk = []
+    if chunk:
+        count, chunk_errors = await import_job_chunk(chunk, workshop_id, manager_id, current_user["id"])
+        imported += count
+        errors += chunk_errors
+
+    return {
+        "imported": imported,
+        "failed": len(errors),
+        "errors": errors[:IMPORT_MAX_ERRORS]
+    }
+
 # ============ ANALYTICS ROUTES ============
 
 @api_router.get("/analytics/dashboard")
-async def get_dashboard_analytics(current_user: dict = Depends(get_current_user)):
+async def get_dashboard_analytics(
+    request: Request,
+    response: Response,
+    source: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can view analytics")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
-        return {
-            "total_jobs": 0,
-            "total_revenue": 0,
-            "total_collected": 0,
-            "total_credits": 0,
-            "avg_job_value": 0,
-            "status_counts": {},
-            "manager_revenue": {},
-            "daily_revenue": {}
-        }
+    not_modified = conditional_get(request, response, current_user)
+    if not_modified:
+        return not_modified
 
-    jobs = await db.jobs.find({"workshop_id": workshop["id"]}, {"_id": 0}).to_list(100000)
+    source = source or DASHBOARD_SOURCE
+    if source not in DASHBOARD_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Invalid source, expected one of: {', '.join(DASHBOARD_SOURCES)}")
 
-    total_jobs = len(jobs)
-    total_revenue = sum(j["estimated_amount"] for j in jobs)
+    workshop_id = current_user["workshop_id"]
+    if not workshop_id:
+        return dashboard_from_rollup({})
 
-    job_ids = [j["id"] for j in jobs]
-    payments = await db.payments.find({"job_id": {"$in": job_ids}}, {"_id": 0}).to_list(100000)
-    total_collected = sum(p["amount"] for p in payments)
-
-    total_credits = total_revenue - total_collected
-
-    status_counts = {}
-    for job in jobs:
-        status = job["status"]
-        status_counts[status] = status_counts.get(status, 0) + 1
-
-    manager_revenue = {}
-    for job in jobs:
-        manager_id = job["manager_id"]
-        if manager_id not in manager_revenue:
-            manager_revenue[manager_id] = {"total": 0, "jobs": 0}
-        manager_revenue[manager_id]["total"] += job["estimated_amount"]
-        manager_revenue[manager_id]["jobs"] += 1
+    if source == "aggregate":
+        rollup = await aggregate_rollup(workshop_id)
+    elif source == "python":
+        rollup = await compute_rollup(workshop_id)
+    else:
+        rollup = await db.analytics_rollups.find_one({"workshop_id": workshop_id}, {"_id": 0})
+    return dashboard_from_rollup(rollup or {})
 
-    now = datetime.now(timezone.utc)
-    daily_revenue = {}
-    for i in range(30):
-        date = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-        daily_revenue[date] = 0
+@api_router.get("/analytics/manager-summary")
+async def get_manager_summary(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != UserRole.MANAGER:
+        raise HTTPException(status_code=403, detail="Only managers have a job summary")
 
-    for job in jobs:
-        created = datetime.fromisoformat(job["created_at"])
-        date = created.strftime("%Y-%m-%d")
-        if date in daily_revenue:
-            daily_revenue[date] += job["estimated_amount"]
+    not_modified = conditional_get(request, response, current_user)
+    if not_modified:
+        return not_modified
 
+    # Grouped in MongoDB so the totals cover every job, not just the first page of /jobs
+    rows = await db.jobs.aggregate([
+        {"$match": {"workshop_id": current_user["workshop_id"], "manager_id": current_user["id"]}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "revenue": {"$sum": "$estimated_amount"}}}
+    ]).to_list(None)
     return {
-        "total_jobs": total_jobs,
-        "total_revenue": total_revenue,
-        "total_collected": total_collected,
-        "total_credits": total_credits,
-        "avg_job_value": total_revenue / total_jobs if total_jobs > 0 else 0,
-        "status_counts": status_counts,
-        "manager_revenue": manager_revenue,
-        "daily_revenue": daily_revenue
+        "total_jobs": sum(row["count"] for row in rows),
+        "total_revenue": sum(row["revenue"] for row in rows),
+        "status_counts": {row["_id"]: row["count"] for row in rows}
     }
 
 @api_router.get("/analytics/export")
-async def export_data(current_user: dict = Depends(get_current_user)):
+async def export_data(
+    format: str = "xlsx",
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Only owners can export data")
 
-    workshop = await db.workshops.find_one({"owner_id": current_user["id"]}, {"_id": 0})
-    if not workshop:
-        raise HTTPException(status_code=404, detail="Workshop not found")
-
-    jobs = await db.jobs.find({"workshop_id": workshop["id"]}, {"_id": 0}).to_list(100000)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of: {', '.join(EXPORT_FORMATS)}")
 
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
-    worksheet = workbook.add_worksheet("Jobs")
+    query = export_jobs_query(require_workshop(current_user), status, None, created_from, created_to)
+    body, headers = await build_jobs_export(query, format)
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
 
-    headers = [
-        "Job ID", "Customer Name", "Phone", "Vehicle Number", "Car Model",
-        "Work Description", "Estimated Amount", "Advance Paid", "Status",
-        "Created At", "Completed At"
-    ]
+# ============ METRICS ROUTES ============
 
-    for col, header in enumerate(headers):
-        worksheet.write(0, col, header)
-
-    for row, job in enumerate(jobs, start=1):
-        worksheet.write(row, 0, job["id"])
-        worksheet.write(row, 1, job["customer_name"])
-        worksheet.write(row, 2, job["phone"])
-        worksheet.write(row, 3, job["vehicle_number"])
-        worksheet.write(row, 4, job["car_model"])
-        worksheet.write(row, 5, job["work_description"])
-        worksheet.write(row, 6, job["estimated_amount"])
-        worksheet.write(row, 7, job["advance_paid"])
-        worksheet.write(row, 8, job["status"])
-        worksheet.write(row, 9, job["created_at"])
-        worksheet.write(row, 10, job.get("completed_at", ""))
-
-    workbook.close()
-    output.seek(0)
+@api_router.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != UserRole.OWNER:
+        raise HTTPException(status_code=403, detail="Only owners can view metrics")
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=jobs_export.xlsx"}
-    )
+    return {
+        "pools": {name: pool.stats() for name, pool in WORKER_POOLS.items()},
+        "document_cache": document_cache.stats(),
+        "audit_log": audit_log.stats(),
+        "tasks": task_runner.stats(),
+        "etags": change_counter.stats()
+    }
 
 # ============ DOCUMENT ROUTES ============
 
 @api_router.get("/documents/job-card/{job_id}")
-async def generate_job_card(job_id: str, current_user: dict = Depends(get_current_user)):
+async def generate_job_card(
+    job_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
     job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -827,109 +2503,338 @@ async def generate_job_card(job_id: str, current_user: dict = Depends(get_curren
     workshop_data = await db.workshops.find_one({"id": job["workshop_id"]}, {"_id": 0})
     currency_symbol = workshop_data.get('currency', 'INR') if workshop_data else 'INR'
 
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-
-    pdf.setFont("Helvetica-Bold", 20)
-    pdf.drawString(1*inch, height - 1*inch, "JOB CARD")
-
-    pdf.setFont("Helvetica", 12)
-    y = height - 1.5*inch
-    pdf.drawString(1*inch, y, f"Job ID: {job['id'][:8]}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Customer: {job['customer_name']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Phone: {job['phone']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Vehicle: {job['car_model']} - {job['vehicle_number']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Work: {job['work_description']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Estimated Amount: {currency_symbol} {job['estimated_amount']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Advance Paid: {currency_symbol} {job['advance_paid']}")
-    y -= 0.3*inch
-    pdf.drawString(1*inch, y, f"Status: {job['status']}")
-
-    pdf.save()
-    buffer.seek(0)
+    card_job = {field: job.get(field) for field in JOB_CARD_FIELDS}
 
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=job_card_{job_id[:8]}.pdf"}
+    return await cached_pdf_response(
+        "job_card",
+        {"job": card_job, "currency": currency_symbol},
+        render_job_card,
+        (card_job, currency_symbol),
+        f"job_card_{job_id[:8]}.pdf",
+        if_none_match
     )
 
 @api_router.get("/documents/invoice/{job_id}")
-async def generate_invoice(job_id: str, current_user: dict = Depends(get_current_user)):
+async def generate_invoice(
+    job_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
     job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
     workshop = await db.workshops.find_one({"id": job["workshop_id"]}, {"_id": 0})
 
-    payments = await db.payments.find({"job_id": job_id}, {"_id": 0}).to_list(1000)
-    total_paid = sum(p["amount"] for p in payments)
-
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-
-    pdf.setFont("Helvetica-Bold", 24)
-    pdf.drawString(1*inch, height - 1*inch, "INVOICE")
-
-    pdf.setFont("Helvetica", 10)
-    y = height - 1.3*inch
-    pdf.drawString(1*inch, y, workshop["name"])
-    y -= 0.2*inch
-    if workshop.get("address"):
-        pdf.drawString(1*inch, y, workshop["address"])
-        y -= 0.2*inch
-    if workshop.get("gst_number"):
-        pdf.drawString(1*inch, y, f"GST: {workshop['gst_number']}")
-        y -= 0.2*inch
-
-    y -= 0.3*inch
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(1*inch, y, "Bill To:")
-    y -= 0.2*inch
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(1*inch, y, job["customer_name"])
-    y -= 0.2*inch
-    pdf.drawString(1*inch, y, job["phone"])
-
-    y -= 0.5*inch
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(1*inch, y, "Service Details")
-    y -= 0.3*inch
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(1*inch, y, f"Vehicle: {job['car_model']} - {job['vehicle_number']}")
-    y -= 0.2*inch
-    pdf.drawString(1*inch, y, f"Work: {job['work_description']}")
-
-    y -= 0.5*inch
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(1*inch, y, "Amount Details")
-    y -= 0.3*inch
-    pdf.setFont("Helvetica", 10)
-    inv_currency = workshop.get('currency', 'INR') if workshop else 'INR'
-    pdf.drawString(1*inch, y, f"Total Amount: {inv_currency} {job['estimated_amount']}")
-    y -= 0.2*inch
-    pdf.drawString(1*inch, y, f"Paid: {inv_currency} {total_paid}")
-    y -= 0.2*inch
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(1*inch, y, f"Balance: {inv_currency} {job['estimated_amount'] - total_paid}")
-
-    pdf.save()
-    buffer.seek(0)
+    inputs, args = invoice_inputs(job, workshop, job.get("total_paid", 0))
+
+    return await cached_pdf_response(
+        "invoice",
+        inputs,
+        render_invoice,
+        args,
+        f"invoice_{job_id[:8]}.pdf",
+        if_none_match
+    )
+
+@api_router.get("/documents/invoices")
+async def generate_invoices_zip(
+    status: Optional[str] = None,
+    manager_id: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != UserRole.OWNER:
+        raise HTTPException(status_code=403, detail="Only owners can download invoices in bulk")
 
+    query = export_jobs_query(require_workshop(current_user), status, manager_id, created_from, created_to)
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=invoice_{job_id[:8]}.pdf"}
+        await build_invoices_zip(query),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=invoices.zip"}
     )
 
+# ============ BACKGROUND TASKS ============
+
+TASK_KINDS = ("export", "invoices")
+TASK_PUBLIC_PROJECTION = {"_id": 0, "params": 0, "result_file_id": 0, "worker_id": 0}
+
+def task_results_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name="task_results")
+
+def task_output(task_data: TaskCreate):
+    # Returns (filename, media_type), validating the parameters up front so bad
+    # submissions fail with a 400 instead of a failed task
+    if task_data.kind not in TASK_KINDS:
+        raise HTTPException(status_code=400, detail=f"Invalid kind, expected one of: {', '.join(TASK_KINDS)}")
+    date_range_query(task_data.created_from, task_data.created_to)
+    if task_data.kind == "invoices":
+        return "invoices.zip", "application/zip"
+    if task_data.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of: {', '.join(EXPORT_FORMATS)}")
+    return f"jobs_export.{task_data.format}", EXPORT_FORMATS[task_data.format]
+
+async def task_body(task: dict):
+    params = task["params"]
+    query = export_jobs_query(
+        task["workshop_id"], params.get("status"), params.get("manager_id"),
+        params.get("created_from"), params.get("created_to")
+    )
+    if task["kind"] == "invoices":
+        return await build_invoices_zip(query)
+    body, _ = await build_jobs_export(query, params["format"])
+    return body
+
+class TaskRunner:
+    # Polls the durable tasks collection from inside the API process. Each worker
+    # claims the oldest queued task whose workshop is below TASK_WORKSHOP_CONCURRENCY
+    # running tasks, so one workshop's backlog cannot hold every slot.
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.claim_lock = asyncio.Lock()
+        self.running = {}
+        self.completed = 0
+        self.failed = 0
+        self.loops = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self.loops else 0,
+            "in_flight": len(self.running),
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def start(self):
+        if self.loops or self.workers <= 0:
+            return
+        self.loops = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.loops.append(asyncio.create_task(self.janitor()))
+
+    async def stop(self):
+        for loop in self.loops:
+            loop.cancel()
+        await asyncio.gather(*self.loops, return_exceptions=True)
+        self.loops = []
+
+    async def claim(self) -> Optional[dict]:
+        # The lock keeps this process's workers from racing past the per-workshop
+        # limit; across processes the limit is enforced per claim and may briefly
+        # be exceeded by one task per process
+        async with self.claim_lock:
+            saturated = await db.tasks.aggregate([
+                {"$match": {"status": TaskStatus.RUNNING}},
+                {"$group": {"_id": "$workshop_id", "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gte": TASK_WORKSHOP_CONCURRENCY}}}
+            ]).to_list(None)
+            now = datetime.now(timezone.utc).isoformat()
+            return await db.tasks.find_one_and_update(
+                {"status": TaskStatus.QUEUED, "workshop_id": {"$nin": [s["_id"] for s in saturated]}},
+                {
+                    "$set": {"status": TaskStatus.RUNNING, "worker_id": self.worker_id, "started_at": now, "heartbeat_at": now},
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("created_at", 1)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+
+    async def work(self):
+        while True:
+            try:
+                task = await self.claim()
+            except PyMongoError as e:
+                logger.warning(f"Task claim failed: {e}")
+                task = None
+            if task is None:
+                await asyncio.sleep(TASK_POLL_INTERVAL)
+                continue
+            # Nothing from one task may end this loop, or the pool silently loses a worker
+            try:
+                await self.run(task)
+            except Exception:
+                logger.exception(f"Task {task['id']} escaped its run")
+
+    async def heartbeat(self, task_id: str):
+        while True:
+            await asyncio.sleep(TASK_HEARTBEAT_INTERVAL)
+            # A failed beat must not end the loop, or the janitor requeues a task that is still running
+            try:
+                await db.tasks.update_one(
+                    {"id": task_id, "worker_id": self.worker_id},
+                    {"$set": {"heartbeat_at": datetime.now(timezone.utc).isoformat()}}
+                )
+            except PyMongoError as e:
+                logger.warning(f"Task {task_id} heartbeat failed: {e}")
+
+    async def run(self, task: dict):
+        self.running[task["id"]] = task
+        heartbeat = asyncio.create_task(self.heartbeat(task["id"]))
+        grid_in = None
+        try:
+            body = await task_body(task)
+            grid_in = task_results_bucket().open_upload_stream(
+                task["filename"],
+                metadata={"task_id": task["id"], "workshop_id": task["workshop_id"]}
+            )
+            async for chunk in body:
+                await grid_in.write(chunk)
+            await grid_in.close()
+            finished = await self.finish(task, {
+                "status": TaskStatus.COMPLETED,
+                "result_file_id": grid_in._id,
+                "result_size": grid_in.length
+            })
+            if finished:
+                self.completed += 1
+            else:
+                # The task was requeued and claimed elsewhere; that run owns the result
+                logger.warning(f"Task {task['id']} was reclaimed before finishing; discarding its result")
+                await self.abort_upload(task, grid_in)
+        except asyncio.CancelledError:
+            # Shutting down: hand the task back without spending an attempt
+            await self.abort_upload(task, grid_in)
+            try:
+                await db.tasks.update_one(
+                    {"id": task["id"], "worker_id": self.worker_id},
+                    {"$set": {"status": TaskStatus.QUEUED, "worker_id": None}, "$inc": {"attempts": -1}}
+                )
+            except PyMongoError as cleanup_error:
+                logger.warning(f"Task {task['id']} could not be requeued on shutdown: {cleanup_error}")
+            raise
+        except Exception as e:
+            logger.exception(f"Task {task['id']} failed")
+            self.failed += 1
+            # If these writes fail too, the task's heartbeat stops and the janitor requeues it
+            await self.abort_upload(task, grid_in)
+            try:
+                await self.finish(task, {"status": TaskStatus.FAILED, "error": str(e)[:500]})
+            except PyMongoError as cleanup_error:
+                logger.warning(f"Task {task['id']} failure could not be recorded: {cleanup_error}")
+        finally:
+            heartbeat.cancel()
+            self.running.pop(task["id"], None)
+
+    async def abort_upload(self, task: dict, grid_in):
+        if grid_in is None:
+            return
+        try:
+            await grid_in.abort()
+        except PyMongoError as e:
+            logger.warning(f"Task {task['id']} result upload could not be removed: {e}")
+
+    async def finish(self, task: dict, update: dict) -> bool:
+        update["finished_at"] = datetime.now(timezone.utc).isoformat()
+        result = await db.tasks.update_one({"id": task["id"], "worker_id": self.worker_id}, {"$set": update})
+        return result.matched_count > 0
+
+    async def janitor(self):
+        while True:
+            try:
+                await self.recover_stale()
+                await self.purge_expired()
+            except PyMongoError as e:
+                logger.warning(f"Task maintenance failed: {e}")
+            await asyncio.sleep(TASK_STALE_AFTER)
+
+    async def recover_stale(self):
+        # Tasks whose worker stopped heartbeating (crash, redeploy) go back on the queue
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=TASK_STALE_AFTER)).isoformat()
+        stale = {"status": TaskStatus.RUNNING, "heartbeat_at": {"$lt": cutoff}}
+        await db.tasks.update_many(
+            {**stale, "attempts": {"$gte": TASK_MAX_ATTEMPTS}},
+            {"$set": {
+                "status": TaskStatus.FAILED,
+                "error": "Task abandoned by its worker too many times",
+                "finished_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        await db.tasks.update_many(stale, {"$set": {"status": TaskStatus.QUEUED, "worker_id": None}})
+
+    async def purge_expired(self):
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=TASK_RESULT_TTL_HOURS)).isoformat()
+        query = {"status": {"$in": [TaskStatus.COMPLETED, TaskStatus.FAILED]}, "finished_at": {"$lt": cutoff}}
+        bucket = task_results_bucket()
+        async for task in db.tasks.find(query, {"_id": 0, "id": 1, "result_file_id": 1}):
+            if task.get("result_file_id"):
+                try:
+                    await bucket.delete(task["result_file_id"])
+                except PyMongoError:
+                    pass
+            await db.tasks.delete_one({"id": task["id"]})
+
+task_runner = TaskRunner(TASK_WORKERS)
+
+# ============ TASK ROUTES ============
+
+def require_task_owner(current_user: dict) -> str:
+    if current_user["role"] != UserRole.OWNER:
+        raise HTTPException(status_code=403, detail="Only owners can run exports and reports")
+    return require_workshop(current_user)
+
+@api_router.post("/tasks", status_code=202)
+async def submit_task(task_data: TaskCreate, current_user: dict = Depends(get_current_user)):
+    workshop_id = require_task_owner(current_user)
+
+    filename, media_type = task_output(task_data)
+    task = {
+        "id": str(uuid.uuid4()),
+        "workshop_id": workshop_id,
+        "created_by": current_user["id"],
+        "kind": task_data.kind,
+        "params": task_data.model_dump(exclude={"kind"}),
+        "filename": filename,
+        "media_type": media_type,
+        "status": TaskStatus.QUEUED,
+        "attempts": 0,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.tasks.insert_one(task)
+    return {"id": task["id"], "status": task["status"]}
+
+@api_router.get("/tasks/{task_id}")
+async def get_task(task_id: str, current_user: dict = Depends(get_current_user)):
+    task = await db.tasks.find_one(
+        {"id": task_id, "workshop_id": require_task_owner(current_user)},
+        TASK_PUBLIC_PROJECTION
+    )
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+@api_router.get("/tasks/{task_id}/result")
+async def download_task_result(task_id: str, current_user: dict = Depends(get_current_user)):
+    task = await db.tasks.find_one(
+        {"id": task_id, "workshop_id": require_task_owner(current_user)},
+        {"_id": 0}
+    )
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["status"] != TaskStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Task is {task['status']}")
+
+    grid_out = await task_results_bucket().open_download_stream(task["result_file_id"])
+
+    async def body():
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=task["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={task['filename']}",
+            "Content-Length": str(grid_out.length)
+        }
+    )
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -946,6 +2851,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def startup_backfill_job_totals():
+    filled = await backfill_job_totals()
+    if filled:
+        logger.info(f"Filled payment totals on {filled} jobs created before they were stored")
+
+@app.on_event("startup")
+async def startup_task_runner():
+    task_runner.start()
+
+@app.on_event("startup")
+async def startup_audit_log():
+    audit_log.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Running tasks requeue themselves and the audit buffer flushes, so both stop while the client is still open
+    await task_runner.stop()
+    await audit_log.stop()
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_worker_pools():
+    for pool in WORKER_POOLS.values():
+        pool.shutdown()
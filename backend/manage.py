@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import UpdateMany, UpdateOne
+
+from main import (
+    db, client, compute_rollup, ensure_indexes, INDEXES, SEARCH_SOURCE_FIELDS, search_keys, due_date,
+    PROFILES, profile_updates, apply_profile_updates, JOB_TOTAL_FIELDS, job_payment_totals,
+    JobCreate, PaymentCreate, JobStatus, build_job, build_payment,
+    write_new_job, write_job_update, write_payment
+)
+
+# ============ MIGRATIONS ============
+
+async def backfill_payment_workshops(args):
+    job_ids = await db.payments.distinct("job_id", {"workshop_id": {"$exists": False}})
+    updated = 0
+
+    for i in range(0, len(job_ids), args.batch_size):
+        chunk = job_ids[i:i + args.batch_size]
+        jobs = await db.jobs.find({"id": {"$in": chunk}}, {"_id": 0, "id": 1, "workshop_id": 1}).to_list(len(chunk))
+
+        by_workshop = {}
+        for job in jobs:
+            by_workshop.setdefault(job["workshop_id"], []).append(job["id"])
+
+        ops = [
+            UpdateMany({"job_id": {"$in": ids}, "workshop_id": {"$exists": False}}, {"$set": {"workshop_id": workshop_id}})
+            for workshop_id, ids in by_workshop.items()
+        ]
+        if ops:
+            result = await db.payments.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+
+    print(f"Backfilled workshop_id on {updated} payments")
+
+async def backfill_search_keys(args):
+    query = {} if args.recompute else {"search_plate": {"$exists": False}}
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in SEARCH_SOURCE_FIELDS}}
+    updated = 0
+    ops = []
+
+    async for job in db.jobs.find(query, projection).batch_size(args.batch_size):
+        keys = search_keys(job)
+        if keys:
+            ops.append(UpdateOne({"id": job["id"]}, {"$set": keys}))
+        if len(ops) >= args.batch_size:
+            updated += (await db.jobs.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.jobs.bulk_write(ops, ordered=False)).modified_count
+
+    print(f"Backfilled search keys on {updated} jobs")
+
+async def backfill_due_dates(args):
+    query = {"due_at": {"$exists": False}}
+    projection = {"_id": 0, "id": 1, "created_at": 1, "planned_completion_days": 1}
+    updated = 0
+    ops = []
+
+    async for job in db.jobs.find(query, projection).batch_size(args.batch_size):
+        ops.append(UpdateOne({"id": job["id"]}, {"$set": {"due_at": due_date(job["created_at"], job["planned_completion_days"])}}))
+        if len(ops) >= args.batch_size:
+            updated += (await db.jobs.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.jobs.bulk_write(ops, ordered=False)).modified_count
+
+    print(f"Backfilled due_at on {updated} jobs")
+
+# ============ JOB TOTALS ============
+
+async def reconcile_job_batch(jobs: list, check: bool) -> int:
+    actual = await job_payment_totals([job["id"] for job in jobs])
+
+    ops = []
+    for job in jobs:
+        fresh = actual[job["id"]]
+        diffs = [
+            f"{field}: stored={job.get(field)} actual={fresh[field]}"
+            for field in JOB_TOTAL_FIELDS
+            if job.get(field) is None or abs(job[field] - fresh[field]) > 1e-6
+        ]
+        if diffs:
+            print(f"Job {job['id']}: {', '.join(diffs)}")
+            # Only overwrite if no payment landed on the job since it was read
+            stored = {field: job.get(field) for field in JOB_TOTAL_FIELDS}
+            ops.append(UpdateOne({"id": job["id"], **stored}, {"$set": fresh}))
+
+    if ops and not check:
+        await db.jobs.bulk_write(ops, ordered=False)
+    return len(ops)
+
+async def reconcile_job_totals(args):
+    query = {"workshop_id": args.workshop_id} if args.workshop_id else {}
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in JOB_TOTAL_FIELDS}}
+
+    checked = drifted = 0
+    batch = []
+    async for job in db.jobs.find(query, projection).batch_size(args.batch_size):
+        batch.append(job)
+        if len(batch) >= args.batch_size:
+            drifted += await reconcile_job_batch(batch, args.check)
+            checked += len(batch)
+            batch = []
+    if batch:
+        drifted += await reconcile_job_batch(batch, args.check)
+        checked += len(batch)
+
+    action = "Checked" if args.check else "Reconciled"
+    print(f"{action} payment totals on {checked} jobs, {drifted} had drifted")
+
+# ============ ANALYTICS ============
+
+def diff_rollups(stored: dict, fresh: dict, prefix: str = "") -> list:
+    diffs = []
+    for key in sorted(set(stored) | set(fresh)):
+        if key == "workshop_id":
+            continue
+        a, b = stored.get(key, 0), fresh.get(key, 0)
+        if isinstance(a, dict) or isinstance(b, dict):
+            diffs += diff_rollups(a or {}, b or {}, f"{prefix}{key}.")
+        elif abs((a or 0) - (b or 0)) > 1e-6:
+            diffs.append(f"{prefix}{key}: stored={a} actual={b}")
+    return diffs
+
+async def rebuild_rollups(args):
+    if args.workshop_id:
+        workshop_ids = [args.workshop_id]
+    else:
+        workshop_ids = await db.workshops.distinct("id")
+
+    drifted = 0
+    for workshop_id in workshop_ids:
+        fresh = await compute_rollup(workshop_id)
+        stored = await db.analytics_rollups.find_one({"workshop_id": workshop_id}, {"_id": 0}) or {}
+        diffs = diff_rollups(stored, fresh)
+        if diffs:
+            drifted += 1
+            print(f"Workshop {workshop_id}: {len(diffs)} differences")
+            for line in diffs:
+                print(f"  {line}")
+
+        if not args.check:
+            await db.analytics_rollups.replace_one({"workshop_id": workshop_id}, fresh, upsert=True)
+
+    action = "Checked" if args.check else "Rebuilt"
+    print(f"{action} rollups for {len(workshop_ids)} workshops, {drifted} had drifted")
+
+async def rebuild_profiles(args):
+    if args.workshop_id:
+        workshop_ids = [args.workshop_id]
+    else:
+        workshop_ids = await db.workshops.distinct("id")
+
+    # Keys are recomputed from the source fields, so profiles follow the current normalization
+    # even on jobs whose stored search keys predate it
+    fields = {"workshop_id", "created_at", "estimated_amount", *SEARCH_SOURCE_FIELDS}
+    for _, _, display in PROFILES.values():
+        fields.update(display)
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+
+    for workshop_id in workshop_ids:
+        for collection in PROFILES:
+            await db[collection].delete_many({"workshop_id": workshop_id})
+
+        # Oldest first so each profile's display fields end up from its latest job
+        cursor = db.jobs.find({"workshop_id": workshop_id}, projection).sort("created_at", 1).batch_size(args.batch_size)
+        batch = []
+        jobs = 0
+        async for job in cursor:
+            batch.append({**job, **search_keys(job)})
+            if len(batch) >= args.batch_size:
+                await apply_profile_updates(profile_updates(batch))
+                jobs += len(batch)
+                batch = []
+        if batch:
+            await apply_profile_updates(profile_updates(batch))
+            jobs += len(batch)
+
+        counts = [f"{await db[collection].count_documents({'workshop_id': workshop_id})} {collection}" for collection in PROFILES]
+        print(f"Workshop {workshop_id}: {jobs} jobs, {', '.join(counts)}")
+
+# ============ INDEXES ============
+
+async def index_report(args):
+    if args.create:
+        await ensure_indexes()
+
+    problems = 0
+    for collection, indexes in INDEXES.items():
+        existing = await db[collection].index_information()
+        existing_keys = {tuple(info["key"]): name for name, info in existing.items()}
+        wanted_keys = {tuple(model.document["key"].items()) for model in indexes}
+
+        for key in wanted_keys - set(existing_keys):
+            problems += 1
+            print(f"MISSING  {collection}: {dict(key)}")
+
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+        for stat in stats:
+            if stat["name"] == "_id_":
+                continue
+            ops = stat["accesses"]["ops"]
+            if ops == 0:
+                problems += 1
+                print(f"UNUSED   {collection}: {stat['name']} (0 ops since {stat['accesses']['since']})")
+            elif args.verbose:
+                print(f"OK       {collection}: {stat['name']} ({ops} ops)")
+
+        for key, name in existing_keys.items():
+            if name != "_id_" and key not in wanted_keys:
+                print(f"EXTRA    {collection}: {name} is not declared in main.INDEXES")
+
+    print(f"{problems} missing or unused indexes")
+
+# ============ BENCHMARKS ============
+
+WRITE_OPERATIONS = ("create_job", "update_job", "create_payment")
+
+async def separate_writes(callback):
+    return await callback(None)
+
+async def transaction_writes(callback):
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+def latency_summary(samples: list) -> str:
+    ordered = sorted(samples)
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return f"mean={statistics.mean(ordered) * 1000:7.2f}ms  p50={percentile(0.5):7.2f}ms  p95={percentile(0.95):7.2f}ms"
+
+async def timed(samples: list, run, callback):
+    started = time.perf_counter()
+    await run(callback)
+    samples.append(time.perf_counter() - started)
+
+async def benchmark_writes(args):
+    # Writes into a throwaway workshop id that is deleted afterwards
+    workshop_id = f"benchmark-{uuid.uuid4()}"
+    manager_id = f"benchmark-{uuid.uuid4()}"
+    modes = {"separate": separate_writes, "transaction": transaction_writes}
+    samples = {(mode, op): [] for mode in modes for op in WRITE_OPERATIONS}
+
+    try:
+        for i in range(args.warmup + args.iterations):
+            # Alternate modes within each iteration so drift affects both equally
+            for mode, run in modes.items():
+                bucket = {op: samples[(mode, op)] if i >= args.warmup else [] for op in WRITE_OPERATIONS}
+
+                job = build_job(JobCreate(
+                    customer_name="Benchmark", phone="0000000000", car_model="Benchmark",
+                    vehicle_number=f"BM-{i}", work_description="Write latency benchmark",
+                    estimated_amount=1000, planned_completion_days=1
+                ), workshop_id, manager_id)
+                await timed(bucket["create_job"], run, lambda session: write_new_job(job, session))
+
+                update_data = {"status": JobStatus.IN_PROGRESS, "updated_at": datetime.now(timezone.utc).isoformat()}
+                await timed(bucket["update_job"], run, lambda session: write_job_update(job["id"], update_data, session))
+
+                payment = build_payment(PaymentCreate(job_id=job["id"], amount=100, payment_type="partial"), workshop_id, manager_id)
+                await timed(bucket["create_payment"], run, lambda session: write_payment(payment, session))
+    finally:
+        await db.payments.delete_many({"workshop_id": workshop_id})
+        await db.jobs.delete_many({"workshop_id": workshop_id})
+        await db.analytics_rollups.delete_many({"workshop_id": workshop_id})
+        for collection in PROFILES:
+            await db[collection].delete_many({"workshop_id": workshop_id})
+
+    print(f"{args.iterations} iterations per mode ({args.warmup} warm-up discarded)")
+    for op in WRITE_OPERATIONS:
+        for mode in modes:
+            print(f"{op:<15} {mode:<12} {latency_summary(samples[(mode, op)])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="RevOps maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-payment-workshops", help="Set workshop_id on payments that predate it")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.set_defaults(handler=backfill_payment_workshops)
+
+    keys = commands.add_parser("backfill-search-keys", help="Set normalized search keys on jobs that predate them")
+    keys.add_argument("--batch-size", type=int, default=500)
+    keys.add_argument("--recompute", action="store_true", help="Rewrite keys on every job after normalization changes")
+    keys.set_defaults(handler=backfill_search_keys)
+
+    due = commands.add_parser("backfill-due-dates", help="Set due_at on jobs that predate the overdue filter")
+    due.add_argument("--batch-size", type=int, default=500)
+    due.set_defaults(handler=backfill_due_dates)
+
+    totals = commands.add_parser("reconcile-job-totals", help="Repair total_paid, confirmed_paid and payment_count on jobs")
+    totals.add_argument("--workshop-id", help="Only reconcile this workshop")
+    totals.add_argument("--batch-size", type=int, default=500)
+    totals.add_argument("--check", action="store_true", help="Report drift without writing")
+    totals.set_defaults(handler=reconcile_job_totals)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recompute analytics rollups from jobs and payments")
+    rollups.add_argument("--workshop-id", help="Only rebuild this workshop")
+    rollups.add_argument("--check", action="store_true", help="Report drift without writing")
+    rollups.set_defaults(handler=rebuild_rollups)
+
+    profiles = commands.add_parser("rebuild-profiles", help="Recompute vehicle and customer profiles from jobs")
+    profiles.add_argument("--workshop-id", help="Only rebuild this workshop")
+    profiles.add_argument("--batch-size", type=int, default=1000)
+    profiles.set_defaults(handler=rebuild_profiles)
+
+    indexes = commands.add_parser("index-report", help="Report missing and unused indexes")
+    indexes.add_argument("--create", action="store_true", help="Create missing indexes before reporting")
+    indexes.add_argument("--verbose", action="store_true", help="Also list indexes that are in use")
+    indexes.set_defaults(handler=index_report)
+
+    bench = commands.add_parser("benchmark-writes", help="Time job/payment writes with and without a transaction")
+    bench.add_argument("--iterations", type=int, default=100)
+    bench.add_argument("--warmup", type=int, default=5)
+    bench.set_defaults(handler=benchmark_writes)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(args.handler(args))
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import asyncio
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Shared by the bcrypt thread pool and the PDF process pool in main.py. Kept free of
+# database imports so spawned worker processes only load what they execute.
+
+WORKER_POOLS = {}
+
+def timed_call(fn, timeout, *args):
+    # Runs inside the executor; the start time lets the caller split queue wait from run time.
+    # The deadline is armed here so queue wait does not count against it, and it interrupts
+    # the call itself so a hung render frees its process instead of holding the slot.
+    started = time.time()
+    if not timeout:
+        return started, fn(*args)
+
+    def expire(signum, frame):
+        raise TimeoutError(f"Call exceeded {timeout}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return started, fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+class WorkerPool:
+    def __init__(self, name: str, executor, max_workers: int):
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        WORKER_POOLS[name] = self
+
+    async def run(self, fn, *args, timeout: Optional[float] = None):
+        # SIGALRM only reaches a process's main thread, so thread pools cannot take a timeout
+        if timeout and not isinstance(self.executor, ProcessPoolExecutor):
+            raise ValueError(f"{self.name} pool cannot enforce timeouts")
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.in_flight += 1
+        try:
+            started, result = await loop.run_in_executor(self.executor, timed_call, fn, timeout, *args)
+        except TimeoutError:
+            self.timed_out += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        finished = time.time()
+        wait, run = max(started - submitted, 0.0), finished - started
+        self.completed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+        return result
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(self.in_flight - self.max_workers, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.wait_total / done * 1000, 2),
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "avg_run_ms": round(self.run_total / done * 1000, 2),
+            "max_run_ms": round(self.run_max * 1000, 2)
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -7,6 +7,7 @@ Tests all CRUD operations, authentication, role-based access, and document gener
 import requests
 import sys
 import json
+import time
 from datetime import datetime
 import os
 from pathlib import Path
@@ -234,11 +235,160 @@ class GarageAPITester:
         # Test owner can view all jobs
         response = self.make_request('GET', 'jobs', use_owner_token=True)
         if response and response.status_code == 200:
-            jobs = response.json()
+            jobs = response.json().get('jobs', [])
             self.log_test("Owner Jobs List", True, f"Owner can view {len(jobs)} jobs")
         else:
             self.log_test("Owner Jobs List", False, f"Failed to retrieve jobs: {response.status_code if response else 'No response'}")
 
+    def test_jobs_pagination(self):
+        """Test keyset pagination on the jobs list"""
+        response = self.make_request('GET', 'jobs?limit=1', use_owner_token=True)
+        if response and response.status_code == 200 and 'next_cursor' in response.json():
+            self.log_test("Jobs Pagination", True, f"First page has {len(response.json()['jobs'])} job(s)")
+        else:
+            self.log_test("Jobs Pagination", False, f"Paginated list failed: {response.status_code if response else 'No response'}")
+
+        response = self.make_request('GET', 'jobs?cursor=not-a-cursor', use_owner_token=True)
+        if response and response.status_code == 400:
+            self.log_test("Invalid Cursor", True, "Malformed cursor correctly rejected")
+        else:
+            self.log_test("Invalid Cursor", False, f"Expected 400, got: {response.status_code if response else 'No response'}")
+
+    def test_list_filters(self):
+        """Test server-side filters and sorting on the jobs and payments lists"""
+        amount = self.job_data['estimated_amount']
+        response = self.make_request('GET', f'jobs?min_amount={amount}&max_amount={amount}&sort=estimated_amount', use_owner_token=True)
+        if response and response.status_code == 200:
+            jobs = response.json()['jobs']
+            self.log_test("Job Filters", all(j['estimated_amount'] == amount for j in jobs) and bool(jobs),
+                          f"{len(jobs)} job(s) at amount {amount}")
+        else:
+            self.log_test("Job Filters", False, f"Status: {response.status_code if response else 'None'}")
+
+        response = self.make_request('GET', 'payments?sort=-amount&limit=5', use_owner_token=True)
+        if response and response.status_code == 200:
+            amounts = [p['amount'] for p in response.json()['payments']]
+            self.log_test("Payment Sort", amounts == sorted(amounts, reverse=True), f"Amounts: {amounts}")
+        else:
+            self.log_test("Payment Sort", False, f"Status: {response.status_code if response else 'None'}")
+
+        response = self.make_request('GET', 'jobs?sort=customer_name', use_owner_token=True)
+        self.log_test("Invalid Sort", bool(response and response.status_code == 400),
+                      f"Status: {response.status_code if response else 'None'}")
+
+    def test_list_fields(self):
+        """Test summary list representation and fields= projection"""
+        response = self.make_request('GET', 'jobs', use_owner_token=True)
+        if response and response.status_code == 200 and response.json()['jobs']:
+            job = response.json()['jobs'][0]
+            self.log_test("Job List Summary", 'internal_notes' not in job and 'remaining_amount' in job,
+                          f"Fields: {', '.join(sorted(job))}")
+        else:
+            self.log_test("Job List Summary", False, f"Status: {response.status_code if response else 'None'}")
+
+        response = self.make_request('GET', 'jobs?fields=status,remaining_amount', use_owner_token=True)
+        if response and response.status_code == 200 and response.json()['jobs']:
+            job = response.json()['jobs'][0]
+            self.log_test("Job List Fields", 'customer_name' not in job and 'remaining_amount' in job,
+                          f"Fields: {', '.join(sorted(job))}")
+        else:
+            self.log_test("Job List Fields", False, f"Status: {response.status_code if response else 'None'}")
+
+        response = self.make_request('GET', 'payments?fields=not_a_field', use_owner_token=True)
+        self.log_test("Unknown Field", bool(response and response.status_code == 400),
+                      f"Status: {response.status_code if response else 'None'}")
+
+    def test_conditional_get(self):
+        """Test ETag revalidation on the jobs list and that writes change the tag"""
+        response = self.make_request('GET', 'jobs', use_owner_token=True)
+        etag = response.headers.get('ETag') if response else None
+        if not etag:
+            self.log_test("Conditional GET", False, "No ETag on jobs list")
+            return False
+
+        url = f"{self.base_url}/jobs"
+        headers = {'Authorization': f'Bearer {self.owner_token}', 'If-None-Match': etag}
+        unchanged = self.session.get(url, headers=headers)
+        self.make_request('PUT', f'jobs/{self.job_id}', {"internal_notes": "Revalidated"}, use_manager_token=True)
+        changed = self.session.get(url, headers=headers)
+        self.log_test("Conditional GET", unchanged.status_code == 304 and changed.status_code == 200,
+                      f"Unchanged: {unchanged.status_code}, after update: {changed.status_code}")
+
+    def test_job_search(self):
+        """Test normalized search by plate and phone"""
+        if not self.job_id:
+            self.log_test("Job Search", False, "No job ID available")
+            return False
+
+        job = self.make_request('GET', f'jobs/{self.job_id}', use_owner_token=True).json()
+        plate = job['vehicle_number'].lower().replace('-', ' ')
+        phone_tail = ''.join(ch for ch in job['phone'] if ch.isdigit())[-6:]
+
+        found = []
+        for q in (plate, phone_tail):
+            response = self.make_request('GET', f'jobs/search?q={q}', use_owner_token=True)
+            found.append(bool(response and response.status_code == 200 and
+                              any(j['id'] == self.job_id for j in response.json()['jobs'])))
+
+        self.log_test("Job Search", all(found), f"Plate match: {found[0]}, phone suffix match: {found[1]}")
+
+    def test_vehicle_history(self):
+        """Test vehicle history is found by a differently formatted plate"""
+        if not self.job_id:
+            self.log_test("Vehicle History", False, "No job ID available")
+            return False
+
+        job = self.make_request('GET', f'jobs/{self.job_id}', use_owner_token=True).json()
+        plate = job['vehicle_number'].replace('-', '').lower()
+        response = self.make_request('GET', f'vehicles/{plate}/history', use_owner_token=True)
+        if response and response.status_code == 200:
+            history = response.json()
+            found = any(j['id'] == self.job_id for j in history['jobs'])
+            self.log_test("Vehicle History", found and history['profile']['job_count'] >= 1,
+                          f"{len(history['jobs'])} jobs, lifetime value {history['profile']['lifetime_value']}")
+        else:
+            self.log_test("Vehicle History", False, f"Status: {response.status_code if response else 'None'}")
+
+    def test_job_timeline(self):
+        """Test job detail history counts and the paginated updates timeline"""
+        if not self.job_id:
+            self.log_test("Job Timeline", False, "No job ID available")
+            return False
+
+        detail = self.make_request('GET', f'jobs/{self.job_id}', use_manager_token=True)
+        response = self.make_request('GET', f'jobs/{self.job_id}/updates?limit=1', use_manager_token=True)
+        if detail and detail.status_code == 200 and response and response.status_code == 200:
+            job = detail.json()
+            self.log_test("Job Timeline", True,
+                          f"{len(job['updates'])} of {job['update_count']} updates embedded, first page has {len(response.json()['updates'])}")
+        else:
+            self.log_test("Job Timeline", False, f"Status: {response.status_code if response else 'None'}")
+
+    def test_job_import(self):
+        """Test bulk CSV import with a per-row error report"""
+        if not self.manager_token:
+            self.log_test("Job Import", False, "No manager token available")
+            return False
+
+        rows = [
+            "customer_name,phone,car_model,vehicle_number,work_description,estimated_amount,planned_completion_days",
+            "Imported Customer,+91 98765 00001,Honda City,KL-07-CD-0001,Imported job,4500,2",
+            "Bad Row,+91 98765 00002,Honda City,KL-07-CD-0002,Imported job,not-a-number,2",
+        ]
+        headers = {'Authorization': f'Bearer {self.manager_token}', 'Content-Type': 'text/csv'}
+        try:
+            response = self.session.post(f"{self.base_url}/jobs/import", data="\n".join(rows).encode(), headers=headers)
+        except Exception as e:
+            print(f"Request failed: {str(e)}")
+            response = None
+
+        if response and response.status_code == 200:
+            result = response.json()
+            success = result['imported'] == 1 and [e['row'] for e in result['errors']] == [2]
+            self.log_test("Job Import", success, f"Imported {result['imported']}, errors: {result['errors']}")
+        else:
+            self.log_test("Job Import", False, f"Status: {response.status_code if response else 'None'}")
+
     def test_payment_recording(self):
         """Test payment recording by manager"""
         if not self.job_id or not self.manager_token:
@@ -270,7 +420,7 @@ class GarageAPITester:
         # Get payments first
         response = self.make_request('GET', 'payments?confirmed=false', use_owner_token=True)
         if response and response.status_code == 200:
-            payments = response.json()
+            payments = response.json()['payments']
             if payments:
                 payment_id = payments[0]['id']
                 # Confirm the payment
@@ -284,6 +434,24 @@ class GarageAPITester:
         else:
             self.log_test("Payment Confirmation", False, "Failed to retrieve payments")
 
+    def test_bulk_confirmation(self):
+        """Test bulk payment confirmation reports an outcome per id"""
+        if not self.job_id:
+            self.log_test("Bulk Payment Confirmation", False, "No job ID available")
+            return False
+
+        response = self.make_request('PUT', 'payments/confirm', {"ids": ["does-not-exist"]}, use_owner_token=True)
+        if response and response.status_code == 200 and response.json()['results'][0]['status'] == 'not_found':
+            self.log_test("Bulk Payment Confirmation", True, "Unknown id reported as not_found")
+        else:
+            self.log_test("Bulk Payment Confirmation", False, f"Status: {response.status_code if response else 'None'}")
+
+        response = self.make_request('PUT', 'payments/confirm', {"job_id": self.job_id}, use_owner_token=True)
+        if response and response.status_code == 200:
+            self.log_test("Bulk Payment Confirmation by Filter", True, f"Confirmed {response.json()['confirmed']} payments")
+        else:
+            self.log_test("Bulk Payment Confirmation by Filter", False, f"Status: {response.status_code if response else 'None'}")
+
     def test_job_status_update(self):
         """Test job status update by manager"""
         if not self.job_id or not self.manager_token:
@@ -318,6 +486,42 @@ class GarageAPITester:
             error_msg = response.json().get('detail', 'Unknown error') if response else 'No response'
             self.log_test("Analytics Dashboard", False, f"Status: {response.status_code if response else 'None'}, Error: {error_msg}")
 
+    def test_analytics_sources_match(self):
+        """Test rollup, aggregation and Python dashboard implementations agree"""
+        results = {}
+        for source in ['rollup', 'aggregate', 'python']:
+            response = self.make_request('GET', f'analytics/dashboard?source={source}', use_owner_token=True)
+            if not response or response.status_code != 200:
+                self.log_test("Analytics Sources Match", False, f"Source {source} failed: {response.status_code if response else 'No response'}")
+                return
+            results[source] = response.json()
+
+        mismatched = [s for s in ['aggregate', 'python'] if results[s] != results['rollup']]
+        if not mismatched:
+            self.log_test("Analytics Sources Match", True, "Rollup, aggregate and python dashboards are identical")
+        else:
+            self.log_test("Analytics Sources Match", False, f"Differs from rollup: {mismatched}")
+
+    def test_manager_summary(self):
+        """Test manager dashboard totals cover all of the manager's jobs"""
+        summary = self.make_request('GET', 'analytics/manager-summary', use_manager_token=True)
+        dashboard = self.make_request('GET', 'analytics/dashboard', use_owner_token=True)
+        if not summary or summary.status_code != 200 or not dashboard or dashboard.status_code != 200:
+            self.log_test("Manager Summary", False, f"Status: {summary.status_code if summary else 'None'}")
+            return
+
+        data = summary.json()
+        # The test workshop has a single manager, so their totals match the owner's dashboard
+        expected = dashboard.json()
+        if data['total_jobs'] == expected['total_jobs'] and data['total_revenue'] == expected['total_revenue']:
+            self.log_test("Manager Summary", True, f"{data['total_jobs']} jobs, ₹{data['total_revenue']} revenue")
+        else:
+            self.log_test("Manager Summary", False, f"Summary {data} does not match dashboard totals")
+
+        response = self.make_request('GET', 'analytics/manager-summary', use_owner_token=True)
+        if not response or response.status_code != 403:
+            self.log_test("Manager Summary", False, f"Owner got {response.status_code if response else 'None'}, expected 403")
+
     def test_managers_list(self):
         """Test managers list for owner"""
         if not self.owner_token:
@@ -365,6 +569,36 @@ class GarageAPITester:
             error_msg = response.json().get('detail', 'Unknown error') if response else 'No response'
             self.log_test("Excel Export", False, f"Status: {response.status_code if response else 'None'}, Error: {error_msg}")
 
+    def test_background_export(self):
+        """Test queued export task runs and its result downloads"""
+        if not self.owner_token:
+            self.log_test("Background Export", False, "No owner token available")
+            return False
+
+        response = self.make_request('POST', 'tasks', {"kind": "export", "format": "csv"}, use_owner_token=True)
+        if not response or response.status_code != 202:
+            self.log_test("Background Export", False, f"Submit failed: {response.status_code if response else 'No response'}")
+            return False
+        task_id = response.json()['id']
+
+        task = {}
+        for _ in range(30):
+            response = self.make_request('GET', f'tasks/{task_id}', use_owner_token=True)
+            task = response.json() if response and response.status_code == 200 else {}
+            if task.get('status') in ('completed', 'failed'):
+                break
+            time.sleep(1)
+
+        if task.get('status') != 'completed':
+            self.log_test("Background Export", False, f"Task did not complete: {task}")
+            return False
+
+        response = self.make_request('GET', f'tasks/{task_id}/result', use_owner_token=True)
+        if response and response.status_code == 200:
+            self.log_test("Background Export", True, f"Task result downloaded ({len(response.content)} bytes)")
+        else:
+            self.log_test("Background Export", False, f"Download failed: {response.status_code if response else 'No response'}")
+
     def test_role_based_access(self):
         """Test role-based access control"""
         # Test manager trying to access owner-only endpoints
@@ -412,17 +646,29 @@ class GarageAPITester:
         # Core business logic tests
         if self.test_job_creation():
             self.test_job_retrieval()
+            self.test_jobs_pagination()
+            self.test_job_search()
+            self.test_vehicle_history()
             self.test_payment_recording()
             self.test_payment_confirmation()
+            self.test_list_filters()
+            self.test_list_fields()
+            self.test_conditional_get()
+            self.test_bulk_confirmation()
             self.test_job_status_update()
+            self.test_job_timeline()
+            self.test_job_import()
 
         # Analytics and management
         self.test_analytics_dashboard()
+        self.test_analytics_sources_match()
+        self.test_manager_summary()
         self.test_managers_list()
 
         # Document generation
         self.test_document_generation()
         self.test_excel_export()
+        self.test_background_export()
 
         # Security tests
         self.test_role_based_access()
@@ -192,6 +192,11 @@ export const JobDetail = () => {
                 {(!job.payments || job.payments.length === 0) && (
                   <p className="text-center text-muted-foreground py-4">No payments recorded</p>
                 )}
+                {job.payment_count > (job.payments?.length || 0) && (
+                  <p className="text-center text-xs text-muted-foreground">
+                    Showing latest {job.payments.length} of {job.payment_count} payments
+                  </p>
+                )}
               </div>
             </CardContent>
           </Card>
@@ -13,19 +13,56 @@ export const JobsList = () => {
   const navigate = useNavigate();
   const { user } = useAuth();
   const [jobs, setJobs] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [statusFilter, setStatusFilter] = useState('all');
 
   useEffect(() => {
     fetchJobs();
   }, [statusFilter]);
 
-  const fetchJobs = async () => {
+  // Search runs on the server across all jobs, not just the loaded page
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (term.length < 2) {
+      setSearchResults(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await jobAPI.search(term, { limit: 50 });
+        if (!cancelled) {
+          setSearchResults(response.data.jobs);
+        }
+      } catch (error) {
+        if (!cancelled) {
+          toast.error('Search failed');
+        }
+      }
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm]);
+
+  const fetchJobs = async (cursor = null) => {
     try {
-      const params = statusFilter !== 'all' ? { status: statusFilter } : {};
+      const params = {};
+      if (statusFilter === 'overdue') {
+        params.overdue = true;
+      } else if (statusFilter !== 'all') {
+        params.status = statusFilter;
+      }
+      if (cursor) {
+        params.cursor = cursor;
+      }
       const response = await jobAPI.getAll(params);
-      setJobs(response.data);
+      setJobs(cursor ? [...jobs, ...response.data.jobs] : response.data.jobs);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       toast.error('Failed to load jobs');
     } finally {
@@ -33,11 +70,8 @@ export const JobsList = () => {
     }
   };
 
-  const filteredJobs = jobs.filter(job => 
-    job.customer_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    job.vehicle_number.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    job.car_model.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  const searching = searchResults !== null;
+  const displayedJobs = searching ? searchResults : jobs;
 
   if (loading) {
     return <div className="text-center py-12" data-testid="loading">Loading jobs...</div>;
@@ -50,7 +84,11 @@ export const JobsList = () => {
           <h1 className="text-4xl md:text-5xl font-black tracking-tighter uppercase">
             Jobs
           </h1>
-          <p className="text-muted-foreground mt-2">{filteredJobs.length} total jobs</p>
+          <p className="text-muted-foreground mt-2">
+            {searching
+              ? `${searchResults.length} matching jobs`
+              : `Showing ${jobs.length}${nextCursor ? '+' : ''} jobs`}
+          </p>
         </div>
         {user?.role === 'manager' && (
           <Button 
@@ -69,7 +107,7 @@ export const JobsList = () => {
         <div className="relative">
           <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 w-4 h-4 text-muted-foreground" />
           <Input
-            placeholder="Search by customer, vehicle, or model..."
+            placeholder="Search by customer, vehicle number, or phone..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
             className="pl-10 bg-background border-input"
@@ -82,6 +120,7 @@ export const JobsList = () => {
           </SelectTrigger>
           <SelectContent>
             <SelectItem value="all">All Status</SelectItem>
+            <SelectItem value="overdue">Overdue</SelectItem>
             <SelectItem value="pending">Pending</SelectItem>
             <SelectItem value="in_progress">In Progress</SelectItem>
             <SelectItem value="waiting_for_parts">Waiting for Parts</SelectItem>
@@ -95,7 +134,7 @@ export const JobsList = () => {
 
       {/* Jobs Grid */}
       <div className="grid grid-cols-1 gap-4">
-        {filteredJobs.map((job) => (
+        {displayedJobs.map((job) => (
           <Card 
             key={job.id} 
             className="border-border hover:border-primary/50 transition-colors cursor-pointer"
@@ -137,13 +176,23 @@ export const JobsList = () => {
             </CardContent>
           </Card>
         ))}
-        {filteredJobs.length === 0 && (
+        {displayedJobs.length === 0 && (
           <Card className="border-border">
             <CardContent className="p-12 text-center">
               <p className="text-muted-foreground">No jobs found</p>
             </CardContent>
           </Card>
         )}
+        {nextCursor && !searching && (
+          <Button
+            variant="outline"
+            onClick={() => fetchJobs(nextCursor)}
+            className="rounded-sm"
+            data-testid="load-more-jobs-btn"
+          >
+            Load More
+          </Button>
+        )}
       </div>
     </div>
   );
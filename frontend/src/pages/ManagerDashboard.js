@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
-import { jobAPI } from '@/services/api';
+import { analyticsAPI, jobAPI } from '@/services/api';
 import { Plus, Briefcase, Clock, CheckCircle } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'sonner';
@@ -10,16 +10,22 @@ import { motion } from 'framer-motion';
 export const ManagerDashboard = () => {
   const navigate = useNavigate();
   const [jobs, setJobs] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    fetchJobs();
+    fetchDashboard();
   }, []);
 
-  const fetchJobs = async () => {
+  const fetchDashboard = async () => {
     try {
-      const response = await jobAPI.getAll();
-      setJobs(response.data);
+      // Totals come from the server; the jobs list is only the most recent page
+      const [jobsResponse, summaryResponse] = await Promise.all([
+        jobAPI.getAll({ limit: 5 }),
+        analyticsAPI.getManagerSummary()
+      ]);
+      setJobs(jobsResponse.data.jobs);
+      setSummary(summaryResponse.data);
     } catch (error) {
       toast.error('Failed to load jobs');
     } finally {
@@ -27,11 +33,12 @@ export const ManagerDashboard = () => {
     }
   };
 
+  const statusCounts = summary?.status_counts || {};
   const stats = {
-    total: jobs.length,
-    pending: jobs.filter(j => j.status === 'pending' || j.status === 'in_progress').length,
-    completed: jobs.filter(j => j.status === 'completed' || j.status === 'delivered').length,
-    totalRevenue: jobs.reduce((sum, j) => sum + j.estimated_amount, 0)
+    total: summary?.total_jobs || 0,
+    pending: (statusCounts.pending || 0) + (statusCounts.in_progress || 0),
+    completed: (statusCounts.completed || 0) + (statusCounts.delivered || 0),
+    totalRevenue: summary?.total_revenue || 0
   };
 
   if (loading) {
@@ -6,9 +6,15 @@ import { CheckCircle, Clock } from 'lucide-react';
 import { toast } from 'sonner';
 import { useAuth } from '@/context/AuthContext';
 
+// Oldest unconfirmed payments first, so the owner works through the backlog in order
+const PENDING_PARAMS = { confirmed: false, sort: 'payment_date', limit: 200 };
+
 export const PaymentsPage = () => {
   const { user } = useAuth();
   const [payments, setPayments] = useState([]);
+  const [pendingPayments, setPendingPayments] = useState([]);
+  const [pendingCursor, setPendingCursor] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
   const [settlements, setSettlements] = useState([]);
   const [loading, setLoading] = useState(true);
 
@@ -18,11 +24,15 @@ export const PaymentsPage = () => {
 
   const fetchData = async () => {
     try {
-      const [paymentsRes, settlementsRes] = await Promise.all([
+      const [paymentsRes, pendingRes, settlementsRes] = await Promise.all([
         paymentAPI.getAll(),
+        paymentAPI.getAll(PENDING_PARAMS),
         settlementAPI.getAll()
       ]);
-      setPayments(paymentsRes.data);
+      setPayments(paymentsRes.data.payments);
+      setNextCursor(paymentsRes.data.next_cursor);
+      setPendingPayments(pendingRes.data.payments);
+      setPendingCursor(pendingRes.data.next_cursor);
       setSettlements(settlementsRes.data);
     } catch (error) {
       toast.error('Failed to load payments');
@@ -31,6 +41,26 @@ export const PaymentsPage = () => {
     }
   };
 
+  const loadMorePayments = async () => {
+    try {
+      const response = await paymentAPI.getAll({ cursor: nextCursor });
+      setPayments([...payments, ...response.data.payments]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load payments');
+    }
+  };
+
+  const loadMorePending = async () => {
+    try {
+      const response = await paymentAPI.getAll({ ...PENDING_PARAMS, cursor: pendingCursor });
+      setPendingPayments([...pendingPayments, ...response.data.payments]);
+      setPendingCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load payments');
+    }
+  };
+
   const confirmPayment = async (id) => {
     try {
       await paymentAPI.confirm(id);
@@ -55,8 +85,6 @@ export const PaymentsPage = () => {
     return <div className="text-center py-12" data-testid="loading">Loading...</div>;
   }
 
-  const pendingPayments = payments.filter(p => !p.confirmed_by_owner);
-  const confirmedPayments = payments.filter(p => p.confirmed_by_owner);
   const pendingSettlements = settlements.filter(s => !s.confirmed_by_owner);
 
   return (
@@ -66,7 +94,7 @@ export const PaymentsPage = () => {
           Payments
         </h1>
         <p className="text-muted-foreground mt-2">
-          {payments.length} total payments | {pendingPayments.length} pending confirmation
+          {payments.length}{nextCursor ? '+' : ''} payments | {pendingPayments.length}{pendingCursor ? '+' : ''} pending confirmation
         </p>
       </div>
 
@@ -104,6 +132,16 @@ export const PaymentsPage = () => {
                     </p>
                   </div>
                 ))}
+                {pendingCursor && (
+                  <Button
+                    variant="outline"
+                    onClick={loadMorePending}
+                    className="w-full rounded-sm"
+                    data-testid="load-more-pending-btn"
+                  >
+                    Load More
+                  </Button>
+                )}
               </div>
             </CardContent>
           </Card>
@@ -173,6 +211,16 @@ export const PaymentsPage = () => {
               {payments.length === 0 && (
                 <p className="text-center text-muted-foreground py-8">No payments yet</p>
               )}
+              {nextCursor && (
+                <Button
+                  variant="outline"
+                  onClick={loadMorePayments}
+                  className="w-full rounded-sm"
+                  data-testid="load-more-payments-btn"
+                >
+                  Load More
+                </Button>
+              )}
             </div>
           </CardContent>
         </Card>
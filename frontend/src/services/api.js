@@ -23,25 +23,40 @@ export const managerAPI = {
 export const jobAPI = {
   create: (data) => axios.post(`${API_URL}/jobs`, data, { headers: getAuthHeader() }),
   getAll: (params) => axios.get(`${API_URL}/jobs`, { params, headers: getAuthHeader() }),
+  search: (q, params) => axios.get(`${API_URL}/jobs/search`, { params: { q, ...params }, headers: getAuthHeader() }),
   getById: (id) => axios.get(`${API_URL}/jobs/${id}`, { headers: getAuthHeader() }),
+  getUpdates: (id, params) => axios.get(`${API_URL}/jobs/${id}/updates`, { params, headers: getAuthHeader() }),
+  import: (file, params) => axios.post(`${API_URL}/jobs/import`, file, {
+    params,
+    headers: { ...getAuthHeader(), 'Content-Type': file.type || 'text/csv' }
+  }),
   update: (id, data) => axios.put(`${API_URL}/jobs/${id}`, data, { headers: getAuthHeader() })
 };
 
+export const historyAPI = {
+  getVehicle: (vehicleNumber) => axios.get(`${API_URL}/vehicles/${encodeURIComponent(vehicleNumber)}/history`, { headers: getAuthHeader() }),
+  getCustomer: (phone) => axios.get(`${API_URL}/customers/${encodeURIComponent(phone)}/history`, { headers: getAuthHeader() })
+};
+
 export const paymentAPI = {
   create: (data) => axios.post(`${API_URL}/payments`, data, { headers: getAuthHeader() }),
   getAll: (params) => axios.get(`${API_URL}/payments`, { params, headers: getAuthHeader() }),
-  confirm: (id) => axios.put(`${API_URL}/payments/${id}/confirm`, {}, { headers: getAuthHeader() })
+  confirm: (id) => axios.put(`${API_URL}/payments/${id}/confirm`, {}, { headers: getAuthHeader() }),
+  confirmMany: (data) => axios.put(`${API_URL}/payments/confirm`, data, { headers: getAuthHeader() })
 };
 
 export const settlementAPI = {
   create: (data) => axios.post(`${API_URL}/settlements`, data, { headers: getAuthHeader() }),
   getAll: (params) => axios.get(`${API_URL}/settlements`, { params, headers: getAuthHeader() }),
-  confirm: (id) => axios.put(`${API_URL}/settlements/${id}/confirm`, {}, { headers: getAuthHeader() })
+  confirm: (id) => axios.put(`${API_URL}/settlements/${id}/confirm`, {}, { headers: getAuthHeader() }),
+  confirmMany: (data) => axios.put(`${API_URL}/settlements/confirm`, data, { headers: getAuthHeader() })
 };
 
 export const analyticsAPI = {
   getDashboard: () => axios.get(`${API_URL}/analytics/dashboard`, { headers: getAuthHeader() }),
-  exportData: () => axios.get(`${API_URL}/analytics/export`, { 
+  getManagerSummary: () => axios.get(`${API_URL}/analytics/manager-summary`, { headers: getAuthHeader() }),
+  exportData: (params) => axios.get(`${API_URL}/analytics/export`, {
+    params,
     headers: getAuthHeader(),
     responseType: 'blob'
   })
@@ -55,5 +70,19 @@ export const documentAPI = {
   getInvoice: (jobId) => axios.get(`${API_URL}/documents/invoice/${jobId}`, {
     headers: getAuthHeader(),
     responseType: 'blob'
+  }),
+  getInvoicesZip: (params) => axios.get(`${API_URL}/documents/invoices`, {
+    params,
+    headers: getAuthHeader(),
+    responseType: 'blob'
+  })
+};
+
+export const taskAPI = {
+  submit: (data) => axios.post(`${API_URL}/tasks`, data, { headers: getAuthHeader() }),
+  get: (id) => axios.get(`${API_URL}/tasks/${id}`, { headers: getAuthHeader() }),
+  getResult: (id) => axios.get(`${API_URL}/tasks/${id}/result`, {
+    headers: getAuthHeader(),
+    responseType: 'blob'
   })
 };